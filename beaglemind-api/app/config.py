@@ -1,10 +1,187 @@
 import os
+from pathlib import Path
+
 import dotenv
 
 dotenv.load_dotenv()
+# beaglemind-api/ directory; relative defaults below resolve against it
+API_ROOT = Path(__file__).resolve().parents[1]
+
 MILVUS_HOST = os.getenv("MILVUS_HOST", "localhost")
 MILVUS_PORT = os.getenv("MILVUS_PORT", 19530)
 MILVUS_USER = os.getenv("MILVUS_USER")
 MILVUS_PASSWORD = os.getenv("MILVUS_PASSWORD")
 MILVUS_TOKEN = os.getenv("MILVUS_TOKEN")
 MILVUS_URI = os.getenv("MILVUS_URI")
+
+# Query embedding micro-batching
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", 3))
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", 16))
+
+# Dedicated retrieval executor and backpressure
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", 4))
+RETRIEVAL_QUEUE_DEPTH = int(os.getenv("RETRIEVAL_QUEUE_DEPTH", 32))
+RETRIEVAL_RETRY_AFTER_S = int(os.getenv("RETRIEVAL_RETRY_AFTER_S", 1))
+
+# Query embedding cache
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", 2048))
+EMBED_CACHE_TTL_S = float(os.getenv("EMBED_CACHE_TTL_S", 3600))
+
+# Retrieval result cache, invalidated by ingestion generation
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 1024))
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", 600))
+INGESTION_STATE_DIR = os.getenv("INGESTION_STATE_DIR", str(API_ROOT / ".cache" / "ingestion"))
+
+# Semantic (near-duplicate query) cache
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", 512))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.97))
+
+
+# Offline ONNX models and tokenizers (shared by retrieval and ingestion).
+# Model variant: "fp32" (onnx/model.onnx) or "int8" (onnx/model.int8.onnx,
+# written by app/scripts/prepare_onnx_models.py), per model or for both
+ONNX_DIR = API_ROOT / "onnx"
+ONNX_MODEL_VARIANT = os.getenv("ONNX_MODEL_VARIANT", "fp32")
+EMBEDDING_MODEL_VARIANT = os.getenv("EMBEDDING_MODEL_VARIANT", ONNX_MODEL_VARIANT)
+RERANKER_MODEL_VARIANT = os.getenv("RERANKER_MODEL_VARIANT", ONNX_MODEL_VARIANT)
+
+
+def onnx_variant_path(stem: str, variant: str) -> Path:
+    return ONNX_DIR / (f"{stem}.onnx" if variant == "fp32" else f"{stem}.{variant}.onnx")
+
+
+EMBEDDING_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH", str(onnx_variant_path("model", EMBEDDING_MODEL_VARIANT)))
+RERANKER_ONNX_PATH = os.getenv(
+    "RERANKER_ONNX_PATH", str(onnx_variant_path("cross_encoder", RERANKER_MODEL_VARIANT))
+)
+EMBEDDING_TOKENIZER_DIR = os.getenv(
+    "EMBEDDING_TOKENIZER_DIR",
+    str(ONNX_DIR / "embedding_tokenizer") if (ONNX_DIR / "embedding_tokenizer").is_dir() else str(ONNX_DIR)
+)
+RERANKER_TOKENIZER_DIR = os.getenv(
+    "RERANKER_TOKENIZER_DIR",
+    str(ONNX_DIR / "reranker_tokenizer") if (ONNX_DIR / "reranker_tokenizer").is_dir() else str(ONNX_DIR)
+)
+
+# Seconds between background checks that the collection is still loaded and
+# its schema unchanged (ingestion events trigger an immediate refresh)
+COLLECTION_STATE_REFRESH_S = float(os.getenv("COLLECTION_STATE_REFRESH_S", 300))
+
+# Maximum number of queries accepted by POST /api/retrieve/batch
+BATCH_RETRIEVE_MAX_QUERIES = int(os.getenv("BATCH_RETRIEVE_MAX_QUERIES", 32))
+
+# Cross-encoder reranking: per-document token cap and micro-batch limits
+RERANK_DOC_TOKEN_CAP = int(os.getenv("RERANK_DOC_TOKEN_CAP", 256))
+RERANK_MAX_BATCH_TOKENS = int(os.getenv("RERANK_MAX_BATCH_TOKENS", 8192))
+RERANK_MAX_BATCH_SIZE = int(os.getenv("RERANK_MAX_BATCH_SIZE", 32))
+
+# Cross-encoder score cache keyed by (query, chunk id)
+RERANK_SCORE_CACHE_SIZE = int(os.getenv("RERANK_SCORE_CACHE_SIZE", 50000))
+RERANK_SCORE_CACHE_TTL_S = float(os.getenv("RERANK_SCORE_CACHE_TTL_S", 86400))
+
+# Reranker document token ids cached by chunk id (filled at ingestion or first rerank)
+DOC_TOKEN_CACHE_SIZE = int(os.getenv("DOC_TOKEN_CACHE_SIZE", 50000))
+
+# Rerank cascade: "full" always reranks n_results*3 candidates; "adaptive" skips
+# the cross-encoder when the top hit clearly wins (L2 distance margin over the
+# runner-up) and otherwise reranks only candidates within a distance spread of it
+RERANK_CASCADE_MODE = os.getenv("RERANK_CASCADE_MODE", "full")
+RERANK_SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", 0.15))
+RERANK_POOL_SPREAD = float(os.getenv("RERANK_POOL_SPREAD", 0.3))
+
+# Prior-based pruning before the cross-encoder: candidates are ranked by
+# (1 - PRIOR_WEIGHT) * vector similarity + PRIOR_WEIGHT * mean stored quality
+# score and only the best PRIOR_PRUNE_TOP_M are reranked (0 disables)
+PRIOR_PRUNE_TOP_M = int(os.getenv("PRIOR_PRUNE_TOP_M", 0))
+PRIOR_WEIGHT = float(os.getenv("PRIOR_WEIGHT", 0.3))
+
+# File grouping: at most FILE_GROUP_CAP candidate chunks per file_path (0 disables).
+# Uses Milvus group-by search, or a post-filter over FILE_GROUP_OVERFETCH times
+# as many hits when the server does not support it
+FILE_GROUP_CAP = int(os.getenv("FILE_GROUP_CAP", 0))
+FILE_GROUP_OVERFETCH = int(os.getenv("FILE_GROUP_OVERFETCH", 3))
+
+# Deadline-aware retrieval (requests with timeout_ms): time kept back for
+# formatting the response, and the initial per-pair cross-encoder cost estimate
+# (refined from observed reranks) used to shrink reranking to the remaining budget
+DEADLINE_RESERVE_MS = float(os.getenv("DEADLINE_RESERVE_MS", 20))
+DEADLINE_RERANK_MS_PER_PAIR = float(os.getenv("DEADLINE_RERANK_MS_PER_PAIR", 3))
+
+# ONNX Runtime session options (0 threads = ORT default). ORT_EXECUTION_MODE is
+# sequential|parallel; ORT_GRAPH_OPTIMIZATION is disable|basic|extended|all and
+# the optimized graph is cached under ORT_OPTIMIZED_MODEL_DIR (empty disables)
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", 0))
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", 0))
+ORT_EXECUTION_MODE = os.getenv("ORT_EXECUTION_MODE", "sequential")
+ORT_GRAPH_OPTIMIZATION = os.getenv("ORT_GRAPH_OPTIMIZATION", "all")
+ORT_OPTIMIZED_MODEL_DIR = os.getenv("ORT_OPTIMIZED_MODEL_DIR", str(API_ROOT / ".cache" / "onnx"))
+
+# Query embedding through IOBinding with reused output buffers; query batches
+# are padded to a multiple of EMBED_PAD_TO_MULTIPLE tokens so shapes repeat
+EMBED_IO_BINDING = os.getenv("EMBED_IO_BINDING", "false").lower() == "true"
+EMBED_PAD_TO_MULTIPLE = int(os.getenv("EMBED_PAD_TO_MULTIPLE", 16))
+
+# Ingestion embedding: chunks are length-sorted and encoded in padded batches
+# of at most INGEST_EMBED_MAX_BATCH_TOKENS (rows x longest row) tokens
+INGEST_EMBED_MAX_BATCH_TOKENS = int(os.getenv("INGEST_EMBED_MAX_BATCH_TOKENS", 16384))
+
+# Multi-process ingestion: INGEST_PROCESSES workers (0 = single process with
+# threads) analyze, chunk and embed fetched files in tasks of
+# INGEST_FILES_PER_TASK files, each with its own ONNX session pinned to
+# INGEST_PROCESS_THREADS intra-op threads (0 = cores / processes)
+INGEST_PROCESSES = int(os.getenv("INGEST_PROCESSES", 0))
+INGEST_PROCESS_THREADS = int(os.getenv("INGEST_PROCESS_THREADS", 0))
+INGEST_FILES_PER_TASK = int(os.getenv("INGEST_FILES_PER_TASK", 16))
+
+# Lexical BM25 index over chunk text, written in segments by the ingestors
+# (compacted once a collection has more than LEXICAL_MAX_SEGMENTS)
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", str(API_ROOT / ".cache" / "lexical"))
+LEXICAL_MAX_SEGMENTS = int(os.getenv("LEXICAL_MAX_SEGMENTS", 8))
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+
+# Retrieval mode: "dense" (vector search) or "hybrid" (BM25 and vector search
+# run concurrently and fused with reciprocal-rank fusion before reranking).
+# In hybrid mode the vector search fetches HYBRID_DENSE_RATIO of the candidate pool
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+HYBRID_DENSE_RATIO = float(os.getenv("HYBRID_DENSE_RATIO", 0.67))
+
+# Symbol index (function/class names, imports and keywords -> chunk ids),
+# written by the GitHub ingestor. With SYMBOL_FAST_PATH, identifier-shaped
+# queries that name a defined symbol and do not ask for reranking are answered
+# from it without vector search;
+# SYMBOL_SEED_CANDIDATES > 0 adds up to that many chunks defining or importing
+# identifiers named in other queries to their candidate pool (0 disables)
+SYMBOL_INDEX_DIR = os.getenv("SYMBOL_INDEX_DIR", str(API_ROOT / ".cache" / "symbols"))
+SYMBOL_FAST_PATH = os.getenv("SYMBOL_FAST_PATH", "false").lower() == "true"
+SYMBOL_SEED_CANDIDATES = int(os.getenv("SYMBOL_SEED_CANDIDATES", 0))
+
+# Vector store backend: "milvus" (server) or "local" (embedded: memory-mapped
+# float32 vectors plus columnar metadata under VECTOR_STORE_DIR, searched in
+# process). Local collections with at least LOCAL_IVF_MIN_ROWS vectors are
+# partitioned into LOCAL_IVF_NLIST k-means lists (0 = always exact search),
+# of which LOCAL_IVF_NPROBE are scanned per query
+VECTOR_STORE = os.getenv("VECTOR_STORE", "milvus").lower()
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", str(API_ROOT / ".cache" / "vectors"))
+LOCAL_IVF_NLIST = int(os.getenv("LOCAL_IVF_NLIST", 0))
+LOCAL_IVF_NPROBE = int(os.getenv("LOCAL_IVF_NPROBE", 8))
+LOCAL_IVF_MIN_ROWS = int(os.getenv("LOCAL_IVF_MIN_ROWS", 50000))
+
+# Vector index on the embedding field. VECTOR_INDEX_TYPE "auto" uses FLAT below
+# VECTOR_INDEX_FLAT_MAX_ROWS rows, IVF_SQ8 from VECTOR_INDEX_SQ8_MIN_ROWS and
+# HNSW in between (or force FLAT, IVF_FLAT, IVF_SQ8, HNSW); nlist and
+# M/efConstruction are derived from the row count. After writing, ingestors
+# report an index that has drifted from this policy or from VECTOR_METRIC
+# (L2, IP or COSINE); app.scripts.reindex_collection migrates it. With
+# VECTOR_INDEX_AUTO_REBUILD they rebuild it instead, which releases the
+# collection (searches fail) until the new index is loaded.
+# VECTOR_SEARCH_NPROBE / VECTOR_SEARCH_EF are search defaults (0 = derived from
+# the index), overridable per request
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "auto").upper()
+VECTOR_METRIC = os.getenv("VECTOR_METRIC", "L2").upper()
+VECTOR_INDEX_FLAT_MAX_ROWS = int(os.getenv("VECTOR_INDEX_FLAT_MAX_ROWS", 10000))
+VECTOR_INDEX_SQ8_MIN_ROWS = int(os.getenv("VECTOR_INDEX_SQ8_MIN_ROWS", 2000000))
+VECTOR_INDEX_AUTO_REBUILD = os.getenv("VECTOR_INDEX_AUTO_REBUILD", "false").lower() == "true"
+VECTOR_SEARCH_NPROBE = int(os.getenv("VECTOR_SEARCH_NPROBE", 0))
+VECTOR_SEARCH_EF = int(os.getenv("VECTOR_SEARCH_EF", 0))
@@ -1,16 +1,37 @@
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Literal, Optional
 
 
 class RetrieveRequest(BaseModel):
     query: str
     collection_name: str = "beaglemind_col"
-    n_results: int = 10
+    n_results: int = Field(10, ge=1, le=100)
     include_metadata: bool = True
     rerank: bool = True
+    rerank_mode: Optional[Literal["full", "adaptive"]] = None
+    max_chunks_per_file: Optional[int] = Field(None, ge=0)
+    retrieval_mode: Optional[Literal["dense", "hybrid"]] = None
+    timeout_ms: Optional[int] = Field(None, ge=1, le=600000)
+    nprobe: Optional[int] = Field(None, ge=1, le=65536)
+    ef: Optional[int] = Field(None, ge=1, le=32768)
+
+
+class BatchRetrieveRequest(BaseModel):
+    queries: List[str]
+    collection_name: str = "beaglemind_col"
+    n_results: int = Field(10, ge=1, le=100)
+    include_metadata: bool = True
+    rerank: bool = True
+    rerank_mode: Optional[Literal["full", "adaptive"]] = None
+    max_chunks_per_file: Optional[int] = Field(None, ge=0)
+    retrieval_mode: Optional[Literal["dense", "hybrid"]] = None
+    timeout_ms: Optional[int] = Field(None, ge=1, le=600000)
+    nprobe: Optional[int] = Field(None, ge=1, le=65536)
+    ef: Optional[int] = Field(None, ge=1, le=32768)
 
 
 class DocumentMetadata(BaseModel):
+    id: Optional[str] = None
     score: float
     distance: float
     file_name: Optional[str] = None
@@ -31,3 +52,9 @@ class RetrieveResponse(BaseModel):
     distances: List[List[float]]
     total_found: int
     filtered_results: int
+    search_info: Optional[Dict[str, Any]] = None
+
+
+
+class BatchRetrieveResponse(BaseModel):
+    results: List[RetrieveResponse]
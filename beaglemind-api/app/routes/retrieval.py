@@ -1,49 +1,185 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
 from fastapi import APIRouter, HTTPException
-from app.models.schemas import RetrieveRequest, RetrieveResponse
+from app.config import RETRIEVAL_WORKERS, RETRIEVAL_QUEUE_DEPTH, RETRIEVAL_RETRY_AFTER_S, BATCH_RETRIEVE_MAX_QUERIES
+from app.models.schemas import RetrieveRequest, RetrieveResponse, BatchRetrieveRequest, BatchRetrieveResponse
+from app.services.cache import normalize_query
+from app.services.inference_executor import BoundedInferenceExecutor, ExecutorSaturatedError
 from app.services.retrieval_service import RetrievalService
+from app.services.single_flight import SingleFlight
 from pymilvus import connections, utility, Collection
 import os
 
 router = APIRouter()
 retrieval_services = {}
+_services_lock = threading.Lock()
 
+# Tokenizer, ONNX and Milvus calls are blocking; keep them off the event loop
+retrieval_executor = BoundedInferenceExecutor(
+    max_workers=RETRIEVAL_WORKERS,
+    queue_depth=RETRIEVAL_QUEUE_DEPTH,
+    retry_after=RETRIEVAL_RETRY_AFTER_S
+)
+# Identical concurrent requests (frontend retries, trending questions) share one run
+retrieve_single_flight = SingleFlight()
+
+
+def _get_retrieval_service(collection_name: str) -> RetrievalService:
+    if collection_name in retrieval_services:
+        return retrieval_services[collection_name]
+
+    with _services_lock:
+        if collection_name not in retrieval_services:
+            try:
+                retrieval_service = RetrievalService()
+                retrieval_service.connect_to_milvus()
+                retrieval_service.create_collection(collection_name)
+                retrieval_services[collection_name] = retrieval_service
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Failed to initialize collection {collection_name}: {str(e)}")
+    return retrieval_services[collection_name]
+
+
+def _deadline(timeout_ms: Optional[int]) -> Optional[float]:
+    """Monotonic deadline for a request budget, counted from arrival so queueing is included"""
+    if not timeout_ms or timeout_ms <= 0:
+        return None
+    return time.monotonic() + timeout_ms / 1000
+
+
+def _retrieve_sync(request: RetrieveRequest, deadline: Optional[float] = None) -> Dict[str, Any]:
+    retrieval_service = _get_retrieval_service(request.collection_name)
 
-@router.post("/retrieve", response_model=RetrieveResponse)
-async def retrieve(request: RetrieveRequest):
-    global retrieval_services
-    
-    if request.collection_name not in retrieval_services:
-        try:
-            retrieval_service = RetrievalService()
-            retrieval_service.connect_to_milvus()
-            retrieval_service.create_collection(request.collection_name)
-            retrieval_services[request.collection_name] = retrieval_service
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to initialize collection {request.collection_name}: {str(e)}")
-    
-    retrieval_service = retrieval_services[request.collection_name]
-    
     try:
-        results = retrieval_service.search(
+        return retrieval_service.search(
             query=request.query,
             n_results=request.n_results,
             include_metadata=request.include_metadata,
-            rerank=request.rerank
-        )
-        
-        formatted_metadatas = []
-        for metadata_list in results["metadatas"]:
-            formatted_list = []
-            for metadata in metadata_list:
-                formatted_list.append(metadata)
-            formatted_metadatas.append(formatted_list)
-        
-        return RetrieveResponse(
-            documents=results["documents"],
-            metadatas=formatted_metadatas,
-            distances=results["distances"],
-            total_found=results["total_found"],
-            filtered_results=results["filtered_results"]
+            rerank=request.rerank,
+            rerank_mode=request.rerank_mode,
+            max_chunks_per_file=request.max_chunks_per_file,
+            retrieval_mode=request.retrieval_mode,
+            deadline=deadline,
+            nprobe=request.nprobe,
+            ef=request.ef
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Retrieval failed: {str(e)}")
+
+
+def _request_key(request: RetrieveRequest):
+    # Same normalization as the service's result cache; until the collection's
+    # service exists, only whitespace is collapsed (never merges distinct results)
+    service = retrieval_services.get(request.collection_name)
+    query = service.normalize(request.query) if service is not None else normalize_query(request.query)
+    return (
+        request.collection_name,
+        query,
+        request.n_results,
+        request.include_metadata,
+        request.rerank,
+        request.rerank_mode,
+        request.max_chunks_per_file,
+        request.retrieval_mode,
+        request.timeout_ms,
+        request.nprobe,
+        request.ef,
+    )
+
+
+@router.post("/retrieve", response_model=RetrieveResponse)
+async def retrieve(request: RetrieveRequest):
+    deadline = _deadline(request.timeout_ms)
+    try:
+        results = await retrieve_single_flight.do(
+            _request_key(request),
+            lambda: retrieval_executor.run(_retrieve_sync, request, deadline)
+        )
+    except ExecutorSaturatedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    return _to_response(results)
+
+
+def _to_response(results: Dict[str, Any]) -> RetrieveResponse:
+    formatted_metadatas = []
+    for metadata_list in results["metadatas"]:
+        formatted_list = []
+        for metadata in metadata_list:
+            formatted_list.append(metadata)
+        formatted_metadatas.append(formatted_list)
+
+    return RetrieveResponse(
+        documents=results["documents"],
+        metadatas=formatted_metadatas,
+        distances=results["distances"],
+        total_found=results["total_found"],
+        filtered_results=results["filtered_results"],
+        search_info=results.get("search_info")
+    )
+
+
+def _retrieve_batch_sync(request: BatchRetrieveRequest, deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+    retrieval_service = _get_retrieval_service(request.collection_name)
+
+    try:
+        return retrieval_service.search_batch(
+            queries=request.queries,
+            n_results=request.n_results,
+            include_metadata=request.include_metadata,
+            rerank=request.rerank,
+            rerank_mode=request.rerank_mode,
+            max_chunks_per_file=request.max_chunks_per_file,
+            retrieval_mode=request.retrieval_mode,
+            deadline=deadline,
+            nprobe=request.nprobe,
+            ef=request.ef
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch retrieval failed: {str(e)}")
+
+
+@router.post("/retrieve/batch", response_model=BatchRetrieveResponse)
+async def retrieve_batch(request: BatchRetrieveRequest):
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="queries cannot be empty")
+    if len(request.queries) > BATCH_RETRIEVE_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_RETRIEVE_MAX_QUERIES} queries per batch"
+        )
+
+    deadline = _deadline(request.timeout_ms)
+    try:
+        results = await retrieval_executor.run(_retrieve_batch_sync, request, deadline)
+    except ExecutorSaturatedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    return BatchRetrieveResponse(results=[_to_response(result) for result in results])
+
+
+@router.get("/retrieve/stats")
+async def retrieval_stats():
+    return {
+        "executor": {
+            "in_flight": retrieval_executor.in_flight,
+            "rejected": retrieval_executor.rejected,
+        },
+        "single_flight": {
+            "in_flight": retrieve_single_flight.in_flight,
+            "deduplicated": retrieve_single_flight.deduplicated,
+        },
+        "collections": {
+            name: service.cache_stats() for name, service in list(retrieval_services.items())
+        },
+    }
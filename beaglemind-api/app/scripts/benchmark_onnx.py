@@ -0,0 +1,145 @@
+"""
+Benchmark ONNX Runtime session configurations for the embedding and reranker models.
+
+For every combination of thread count, execution mode, graph optimization
+level and IOBinding it reports session start-up time (cold, and with the
+optimized graph already cached) and per-run latency percentiles on
+query-sized inputs. Use it to pick ORT_* settings for a container's core count.
+
+Usage (from beaglemind-api/):
+  python -m app.scripts.benchmark_onnx
+  python -m app.scripts.benchmark_onnx --model reranker --threads 1,2,4 --batch-sizes 1,30
+  python -m app.scripts.benchmark_onnx --levels disable,all --io-binding both --json results.json
+"""
+
+import argparse
+import itertools
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+from transformers import AutoTokenizer
+
+from app.config import EMBEDDING_ONNX_PATH, RERANKER_ONNX_PATH, EMBEDDING_TOKENIZER_DIR, RERANKER_TOKENIZER_DIR
+from app.services.onnx_engine import IOBoundSession, create_session
+
+MODELS = {
+    "embedding": (EMBEDDING_ONNX_PATH, EMBEDDING_TOKENIZER_DIR),
+    "reranker": (RERANKER_ONNX_PATH, RERANKER_TOKENIZER_DIR),
+}
+
+SAMPLE_QUERY = "How do I configure the PRU on a BeagleBone Black to toggle a GPIO pin?"
+SAMPLE_DOC = (
+    "The Programmable Real-time Units (PRUs) are 32-bit cores that can access "
+    "pins, events and all SoC resources. Use config-pin to set the pin mode, "
+    "then load the firmware through remoteproc and start the core."
+)
+
+
+def _csv(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def build_inputs(model: str, tokenizer, batch_size: int, pad_to_multiple_of: int) -> Dict[str, np.ndarray]:
+    if model == "reranker":
+        encoded = tokenizer([SAMPLE_QUERY] * batch_size, [SAMPLE_DOC] * batch_size, return_tensors="np",
+                            padding=True, truncation=True, max_length=512,
+                            pad_to_multiple_of=pad_to_multiple_of or None)
+    else:
+        encoded = tokenizer([SAMPLE_QUERY] * batch_size, return_tensors="np", padding=True,
+                            truncation=True, max_length=512, pad_to_multiple_of=pad_to_multiple_of or None)
+    return {name: np.asarray(value, dtype=np.int64) for name, value in encoded.items()}
+
+
+def time_runs(session, inputs: Dict[str, np.ndarray], warmup: int, iterations: int) -> Dict[str, float]:
+    names = {i.name for i in session.get_inputs()}
+    feed = {name: value for name, value in inputs.items() if name in names}
+    for _ in range(warmup):
+        session.run(None, feed)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        session.run(None, feed)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+        "mean_ms": statistics.fmean(samples),
+    }
+
+
+def benchmark(args) -> List[Dict[str, Any]]:
+    model_path, tokenizer_dir = MODELS[args.model]
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_dir, local_files_only=True)
+    io_modes = {"off": [False], "on": [True], "both": [False, True]}[args.io_binding]
+    rows = []
+
+    with tempfile.TemporaryDirectory(prefix="ort-bench-") as cache_dir:
+        for threads, mode, level in itertools.product(_csv(args.threads), _csv(args.modes), _csv(args.levels)):
+            settings = dict(intra_op_threads=int(threads), inter_op_threads=args.inter_op_threads,
+                            execution_mode=mode, graph_optimization=level,
+                            cache_dir=str(Path(cache_dir) / f"{threads}-{mode}-{level}"))
+            start = time.perf_counter()
+            session = create_session(model_path, **settings)
+            cold_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            session = create_session(model_path, **settings)
+            warm_ms = (time.perf_counter() - start) * 1000
+
+            for batch_size, io_binding in itertools.product(_csv(args.batch_sizes), io_modes):
+                inputs = build_inputs(args.model, tokenizer, int(batch_size), args.pad_to_multiple_of)
+                runner = IOBoundSession(session) if io_binding else session
+                row = {
+                    "model": args.model,
+                    "intra_op_threads": int(threads),
+                    "execution_mode": mode,
+                    "graph_optimization": level,
+                    "io_binding": io_binding,
+                    "batch_size": int(batch_size),
+                    "seq_len": int(inputs["input_ids"].shape[1]),
+                    "startup_cold_ms": cold_ms,
+                    "startup_cached_ms": warm_ms,
+                    **time_runs(runner, inputs, args.warmup, args.iterations),
+                }
+                rows.append(row)
+                print(
+                    f"threads={threads:>2} mode={mode:<10} opt={level:<8} iobind={str(io_binding):<5} "
+                    f"batch={batch_size:>3} | start {cold_ms:7.1f}/{warm_ms:7.1f} ms | "
+                    f"p50 {row['p50_ms']:7.2f} ms  p95 {row['p95_ms']:7.2f} ms"
+                )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ONNX Runtime configurations")
+    parser.add_argument("--model", choices=sorted(MODELS), default="embedding")
+    parser.add_argument("--threads", default="1,2,4", help="Comma-separated intra-op thread counts (0 = ORT default)")
+    parser.add_argument("--inter-op-threads", type=int, default=0)
+    parser.add_argument("--modes", default="sequential", help="Comma-separated: sequential,parallel")
+    parser.add_argument("--levels", default="disable,basic,all", help="Comma-separated: disable,basic,extended,all")
+    parser.add_argument("--io-binding", choices=["off", "on", "both"], default="both")
+    parser.add_argument("--batch-sizes", default="1,8", help="Comma-separated batch sizes")
+    parser.add_argument("--pad-to-multiple-of", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    if not Path(MODELS[args.model][0]).exists():
+        print(f"Model not found: {MODELS[args.model][0]} (run app/scripts/prepare_onnx_models.py)")
+        sys.exit(1)
+
+    rows = benchmark(args)
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, indent=2))
+        print(f"Wrote {len(rows)} results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
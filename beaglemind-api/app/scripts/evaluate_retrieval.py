@@ -0,0 +1,328 @@
+"""
+Evaluate retrieval quality against latency for a sweep of search configurations.
+
+Exports the collection (chunk ids, embeddings, file paths) to a snapshot,
+computes each golden query's exact nearest neighbours in NumPy, then runs
+every configuration through ``RetrievalService.search`` and reports per
+configuration:
+
+- recall@k: overlap of the top k results with the exact top k
+- MRR: reciprocal rank of the first labelled chunk (``relevant_ids`` or
+  ``relevant_files`` in the golden file), or of the exact nearest neighbour
+  for unlabelled queries
+- latency p50/p95/mean, mean vector search time, and rerank cost (time,
+  cross-encoder pairs and tokens per query)
+
+Result, semantic, stale-fallback, rerank-score and document-token caches are
+cleared before every query so each measurement runs the full pipeline; query
+embeddings are computed once.
+
+Golden file: JSON lines, e.g.
+  {"query": "How do I enable PWM on P9_14?", "relevant_files": ["books/beaglebone-cookbook/04motors/motors.rst"]}
+
+Configurations: JSON list of RetrievalService.search arguments with a "name",
+e.g. [{"name": "hnsw-ef32", "rerank": false, "ef": 32}]; --sweep expands each
+of them over a parameter (--sweep nprobe=8,32,128).
+
+Usage (from beaglemind-api/):
+  python -m app.scripts.evaluate_retrieval --golden eval/golden_queries.jsonl --json eval.json
+  python -m app.scripts.evaluate_retrieval --golden eval/golden_queries.jsonl --sweep nprobe=8,32 --refresh-snapshot
+  python -m app.scripts.evaluate_retrieval --golden eval/golden_queries.jsonl --baseline eval.json --max-drop 0.02
+"""
+
+import argparse
+import itertools
+import json
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.config import API_ROOT
+from app.services.retrieval_service import RetrievalService
+
+DEFAULT_CONFIGS = [
+    {"name": "dense", "rerank": False},
+    {"name": "dense+rerank", "rerank": True, "rerank_mode": "full"},
+    {"name": "dense+adaptive", "rerank": True, "rerank_mode": "adaptive"},
+    {"name": "hybrid+rerank", "rerank": True, "retrieval_mode": "hybrid"},
+]
+
+SNAPSHOT_BATCH = 1000
+
+
+def load_golden(path: str) -> List[Dict[str, Any]]:
+    golden = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                golden.append(json.loads(line))
+    if not golden:
+        sys.exit(f"No queries in {path}")
+    return golden
+
+
+def _parse_value(value: str) -> Any:
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    if value.lower() == "none":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def expand_configs(configs: List[Dict[str, Any]], sweeps: List[str]) -> List[Dict[str, Any]]:
+    """Cartesian product of ``configs`` and every ``key=v1,v2`` sweep"""
+    axes = []
+    for sweep in sweeps:
+        key, _, values = sweep.partition("=")
+        if not values:
+            sys.exit(f"Bad --sweep {sweep!r}, expected key=v1,v2")
+        axes.append([(key, _parse_value(value)) for value in values.split(",")])
+    expanded = []
+    for config in configs:
+        for combination in itertools.product(*axes):
+            variant = dict(config)
+            for key, value in combination:
+                variant[key] = value
+            if combination:
+                variant["name"] = config["name"] + "".join(f" {key}={value}" for key, value in combination)
+            expanded.append(variant)
+    return expanded
+
+
+def export_snapshot(collection, path: Path) -> Dict[str, np.ndarray]:
+    """Write chunk ids, embeddings and file paths of every row to ``path`` (npz)"""
+    fields = ["id", "embedding", "file_path"]
+    rows: List[Dict[str, Any]] = []
+    if hasattr(collection, "query_iterator"):
+        iterator = collection.query_iterator(batch_size=SNAPSHOT_BATCH, output_fields=fields)
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                rows.extend(batch)
+        finally:
+            iterator.close()
+    else:
+        rows = collection.query(expr="", output_fields=fields)
+    snapshot = {
+        "ids": np.array([row["id"] for row in rows]),
+        "embeddings": np.array([row["embedding"] for row in rows], dtype=np.float32),
+        "file_paths": np.array([row.get("file_path") or "" for row in rows]),
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, **snapshot)
+    print(f"Exported {len(rows)} rows to {path}")
+    return snapshot
+
+
+def load_snapshot(path: Path) -> Dict[str, np.ndarray]:
+    with np.load(path) as snapshot:
+        return {key: snapshot[key] for key in snapshot.files}
+
+
+def exact_neighbours(query_embeddings: np.ndarray, embeddings: np.ndarray, k: int) -> np.ndarray:
+    """Row numbers of the ``k`` nearest rows (squared L2) per query, closest first"""
+    if not len(embeddings):
+        raise ValueError("The embedding snapshot is empty")
+    k = min(k, len(embeddings))
+    norms = np.einsum("ij,ij->i", embeddings, embeddings)
+    neighbours = []
+    for query in query_embeddings:
+        distances = norms - 2.0 * embeddings @ query
+        top = np.argpartition(distances, k - 1)[:k]
+        neighbours.append(top[np.argsort(distances[top], kind="stable")])
+    return np.array(neighbours)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def _clear_caches(service: RetrievalService):
+    service.result_cache.clear()
+    service.semantic_cache.clear()
+    service.stale_cache.clear()
+    service.score_cache.clear()
+    if service.rerank_engine is not None:
+        service.rerank_engine.doc_token_cache.clear()
+
+
+def evaluate_config(service: RetrievalService, config: Dict[str, Any], golden: List[Dict[str, Any]],
+                    truth: List[List[str]], repeats: int) -> Dict[str, Any]:
+    params = {key: value for key, value in config.items() if key != "name"}
+    k = params.setdefault("n_results", 10)
+    params.setdefault("include_metadata", True)
+    latencies, vector_ms, rerank_ms, rerank_pairs, rerank_tokens = [], [], [], [], []
+    recalls, reciprocal_ranks = [], []
+    paths: Dict[str, int] = {}
+    errors = 0
+    for entry, exact_ids in zip(golden, truth):
+        for repeat in range(repeats):
+            _clear_caches(service)
+            start = time.perf_counter()
+            try:
+                result = service.search(entry["query"], **params)
+            except Exception as e:
+                errors += 1
+                print(f"  [{config['name']}] {entry['query'][:40]!r} failed: {e}")
+                break
+            latencies.append((time.perf_counter() - start) * 1000)
+            info = result.get("search_info") or {}
+            timings = info.get("timings_ms", {})
+            vector_ms.append(timings.get("vector_search", 0.0))
+            rerank_ms.append(timings.get("rerank", 0.0))
+            rerank_pairs.append((info.get("rerank") or {}).get("pairs", 0))
+            rerank_tokens.append((info.get("rerank") or {}).get("tokens", 0))
+            if repeat:
+                continue
+            paths[info.get("rerank_path", "none")] = paths.get(info.get("rerank_path", "none"), 0) + 1
+            metadatas = result["metadatas"][0] if result.get("metadatas") else []
+            ids = [metadata.get("id") for metadata in metadatas]
+            files = [metadata.get("file_path") for metadata in metadatas]
+            recalls.append(len(set(ids[:k]) & set(exact_ids[:k])) / max(1, min(k, len(exact_ids))))
+            if entry.get("relevant_ids"):
+                relevant = [chunk_id in entry["relevant_ids"] for chunk_id in ids]
+            elif entry.get("relevant_files"):
+                relevant = [file_path in entry["relevant_files"] for file_path in files]
+            else:
+                relevant = [chunk_id == exact_ids[0] for chunk_id in ids] if exact_ids else []
+            reciprocal_ranks.append(next((1.0 / (rank + 1) for rank, hit in enumerate(relevant) if hit), 0.0))
+
+    return {
+        "name": config["name"],
+        "params": params,
+        "queries": len(recalls),
+        "errors": errors,
+        "recall_at_k": float(np.mean(recalls)) if recalls else 0.0,
+        "mrr": float(np.mean(reciprocal_ranks)) if reciprocal_ranks else 0.0,
+        "latency_ms": {
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "mean": statistics.fmean(latencies) if latencies else 0.0,
+        },
+        "vector_search_ms": statistics.fmean(vector_ms) if vector_ms else 0.0,
+        "rerank": {
+            "ms": statistics.fmean(rerank_ms) if rerank_ms else 0.0,
+            "pairs": statistics.fmean(rerank_pairs) if rerank_pairs else 0.0,
+            "tokens": statistics.fmean(rerank_tokens) if rerank_tokens else 0.0,
+            "paths": paths,
+        },
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_drop: float) -> bool:
+    """Print quality/latency deltas against a previous report; False if quality regressed"""
+    previous = {config["name"]: config for config in baseline.get("configs", [])}
+    ok = True
+    print(f"\nAgainst baseline ({baseline.get('created_at', '?')}):")
+    for config in report["configs"]:
+        before = previous.get(config["name"])
+        if before is None:
+            print(f"  {config['name']:<32} (new)")
+            continue
+        recall_delta = config["recall_at_k"] - before["recall_at_k"]
+        mrr_delta = config["mrr"] - before["mrr"]
+        p95_delta = config["latency_ms"]["p95"] - before["latency_ms"]["p95"]
+        regressed = recall_delta < -max_drop or mrr_delta < -max_drop
+        ok = ok and not regressed
+        print(f"  {config['name']:<32} recall {recall_delta:+.3f}  mrr {mrr_delta:+.3f}  "
+              f"p95 {p95_delta:+.1f} ms{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality vs latency against brute-force ground truth")
+    parser.add_argument("--golden", required=True, help="Golden queries (JSON lines)")
+    parser.add_argument("--collection", default="beaglemind_col", help="Collection name")
+    parser.add_argument("--configs", help="JSON file with a list of search configurations")
+    parser.add_argument("--sweep", action="append", default=[], help="key=v1,v2 applied to every configuration")
+    parser.add_argument("--snapshot", help="Snapshot path (default: .cache/eval/<collection>.npz)")
+    parser.add_argument("--refresh-snapshot", action="store_true", help="Re-export even if the snapshot exists")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per query and configuration")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed queries before measuring")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Previous report to compare against")
+    parser.add_argument("--max-drop", type=float, default=0.01,
+                        help="Allowed recall@k/MRR drop against --baseline before exiting with status 1")
+    args = parser.parse_args()
+
+    golden = load_golden(args.golden)
+    if args.configs:
+        with open(args.configs, "r", encoding="utf-8") as f:
+            configs = json.load(f)
+    else:
+        configs = DEFAULT_CONFIGS
+    configs = expand_configs(configs, args.sweep)
+
+    service = RetrievalService()
+    service.open_collection(args.collection)
+
+    snapshot_path = Path(args.snapshot or API_ROOT / ".cache" / "eval" / f"{args.collection}.npz")
+    if args.refresh_snapshot or not snapshot_path.exists():
+        snapshot = export_snapshot(service.collection, snapshot_path)
+    else:
+        snapshot = load_snapshot(snapshot_path)
+    if not len(snapshot["ids"]):
+        sys.exit(f"Snapshot {snapshot_path} has no rows; ingest into '{args.collection}' "
+                 f"or use --refresh-snapshot")
+    collection_rows = service.collection.num_entities
+    if collection_rows != len(snapshot["ids"]):
+        print(f"Warning: snapshot has {len(snapshot['ids'])} rows, collection has {collection_rows} "
+              f"(use --refresh-snapshot)")
+
+    k_max = max(int(config.get("n_results", 10)) for config in configs)
+    query_embeddings = service._encode_queries([entry["query"] for entry in golden])
+    neighbours = exact_neighbours(query_embeddings, snapshot["embeddings"], k_max)
+    truth = [[str(snapshot["ids"][row]) for row in rows] for rows in neighbours]
+
+    for entry in golden[:args.warmup]:
+        _clear_caches(service)
+        service.search(entry["query"])
+
+    results = []
+    for config in configs:
+        print(f"Evaluating {config['name']} ...")
+        results.append(evaluate_config(service, config, golden, truth, max(1, args.repeats)))
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "collection": args.collection,
+        "snapshot": {"path": str(snapshot_path), "rows": int(len(snapshot["ids"]))},
+        "golden": {"path": args.golden, "queries": len(golden),
+                   "labelled": sum(bool(e.get("relevant_ids") or e.get("relevant_files")) for e in golden)},
+        "index": dict(service._vector_index),
+        "repeats": max(1, args.repeats),
+        "configs": results,
+    }
+
+    print(f"\n{'config':<32} {'recall@k':>8} {'mrr':>6} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'search ms':>9} {'rerank ms':>9} {'pairs':>6}")
+    for config in results:
+        print(f"{config['name']:<32} {config['recall_at_k']:>8.3f} {config['mrr']:>6.3f} "
+              f"{config['latency_ms']['p50']:>8.1f} {config['latency_ms']['p95']:>8.1f} "
+              f"{config['vector_search_ms']:>9.1f} {config['rerank']['ms']:>9.1f} {config['rerank']['pairs']:>6.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.max_drop):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,20 @@ import re
 import uuid
 import logging
 from typing import List, Dict, Any
-from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType, utility
+from pymilvus import connections, FieldSchema, CollectionSchema, DataType
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-import onnxruntime as ort
-from transformers import AutoTokenizer
 import numpy as np
 from datetime import datetime
 import dotenv
 from pathlib import Path
 
+from app.config import VECTOR_INDEX_AUTO_REBUILD
+from app.services.ingestion_events import collection_generations
+from app.services.lexical_index import lexical_indexes
+from app.services.model_registry import model_registry
+from app.services.vector_index import ensure_vector_index, index_params, report_index_drift
+from app.services.vector_store import Collection, utility, USE_LOCAL_STORE
+
 dotenv.load_dotenv()
 MILVUS_HOST = os.getenv("MILVUS_HOST", "localhost")
 MILVUS_PORT = os.getenv("MILVUS_PORT", 19530)
@@ -72,6 +77,8 @@ def semantic_chunk_post(content: str, language: str = "text", chunk_size: int =
     return [chunk for chunk in chunks if len(chunk.strip()) > 10]
 
 def connect_milvus():
+    if USE_LOCAL_STORE:
+        return
     connect_kwargs = {'alias': "default", 'timeout': 30}
     if MILVUS_URI:
         connect_kwargs['uri'] = MILVUS_URI
@@ -116,8 +123,7 @@ def get_or_create_collection(collection_name: str, embedding_dim: int) -> Collec
     else:
         logger.info(f"Creating collection '{collection_name}'")
         col = Collection(collection_name, schema)
-        index_params = {"metric_type": "L2", "index_type": "IVF_FLAT", "params": {"nlist": 1024}}
-        col.create_index("embedding", index_params)
+        col.create_index("embedding", index_params(0))
 
     col.load()
     return col
@@ -125,16 +131,11 @@ def get_or_create_collection(collection_name: str, embedding_dim: int) -> Collec
 def ingest_forum_json(json_path: str, collection_name: str = "beaglemind_col", model_name: str = "BAAI/bge-base-en-v1.5"):
     connect_milvus()
     
-    # Initialize ONNX embedding model (offline/local files)
-    # Resolve absolute path to the onnx assets directory: <repo>/beaglemind-api/onnx
-    script_path = Path(__file__).resolve()
-    onnx_dir = script_path.parents[2] / "onnx"
-    tokenizer = AutoTokenizer.from_pretrained(str(onnx_dir), local_files_only=True)
-    session = ort.InferenceSession(str(onnx_dir / "model.onnx"))
+    # Initialize ONNX embedding model (offline/local files, shared via the model registry)
+    tokenizer, session = model_registry.embedding_model()
     
     # Get embedding dimension
-    sample_embedding = _encode_text("test", tokenizer, session)
-    embedding_dim = len(sample_embedding)
+    embedding_dim = model_registry.embedding_dim()
     logger.info(f"Embedding dimension: {embedding_dim}")
     
     collection = get_or_create_collection(collection_name, embedding_dim)
@@ -266,8 +267,31 @@ def ingest_forum_json(json_path: str, collection_name: str = "beaglemind_col", m
         
         collection.insert(entities)
         collection.flush()
+        # Invalidate cached retrieval results in the API process
+        collection_generations.bump(collection_name)
         logger.info(f"Inserted {batch_end}/{len(chunk_data)} chunks")
     
+    # BM25 index for hybrid retrieval, one segment for this import
+    try:
+        lexical_indexes.add(collection_name, [item['id'] for item in chunk_data],
+                            [item['document'] for item in chunk_data])
+        collection_generations.bump(collection_name)
+    except Exception as e:
+        logger.warning(f"Could not update the lexical index: {e}")
+    
+    # Grow the vector index with the collection (see app.services.vector_index)
+    if VECTOR_INDEX_AUTO_REBUILD:
+        try:
+            if ensure_vector_index(collection):
+                collection_generations.bump(collection_name)
+        except Exception as e:
+            logger.warning(f"Could not rebuild the vector index: {e}")
+    else:
+        try:
+            report_index_drift(collection)
+        except Exception as e:
+            logger.warning(f"Could not describe the vector index: {e}")
+    
     logger.info(f"Forum ingestion complete: {len(chunk_data)} chunks stored in '{collection_name}'")
 
 if __name__ == "__main__":
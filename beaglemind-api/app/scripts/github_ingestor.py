@@ -38,7 +38,7 @@ from urllib.parse import urljoin, urlparse
 from dotenv import load_dotenv
 
 #from app.config import MILVUS_HOST, MILVUS_PORT, MILVUS_USER, MILVUS_PASSWORD, MILVUS_TOKEN, MILVUS_URI
-from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType, utility
+from pymilvus import connections, CollectionSchema, FieldSchema, DataType
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from transformers import AutoTokenizer
 from concurrent.futures import ThreadPoolExecutor
@@ -50,6 +50,21 @@ import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
 import os
 import dotenv
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from app.config import (
+    INGEST_EMBED_MAX_BATCH_TOKENS, INGEST_PROCESSES, INGEST_PROCESS_THREADS, INGEST_FILES_PER_TASK,
+    EMBEDDING_ONNX_PATH, EMBEDDING_TOKENIZER_DIR, VECTOR_STORE_DIR, VECTOR_INDEX_AUTO_REBUILD
+)
+from app.services.embedding_batcher import encode_texts_sorted
+from app.services.onnx_engine import create_session
+from app.services.ingestion_events import collection_generations
+from app.services.lexical_index import lexical_indexes
+from app.services.symbol_index import chunk_symbols, symbol_indexes
+from app.services.model_registry import model_registry
+from app.services.vector_index import ensure_vector_index, index_params, report_index_drift
+from app.services.vector_store import Collection, utility, USE_LOCAL_STORE
 
 dotenv.load_dotenv()
 MILVUS_HOST = os.getenv("MILVUS_HOST", "localhost")
@@ -80,15 +95,11 @@ class GitHubDirectIngester:
         self.collection_name = collection_name
         self.model_name = model_name
         self.github_token = github_token
+        self._init_parsing()
         
-        # Initialize ONNX embedding model (offline mode)
+        # Initialize ONNX embedding model (offline mode, shared via the model registry)
         try:
-            # Use local tokenizer files instead of downloading from HuggingFace
-            self.embedding_tokenizer = AutoTokenizer.from_pretrained(
-                "onnx/", 
-                local_files_only=True
-            )
-            self.embedding_session = ort.InferenceSession("onnx/model.onnx")
+            self.embedding_tokenizer, self.embedding_session = model_registry.embedding_model()
             logger.info(f"Loaded ONNX embedding model offline: {model_name}")
         except Exception as e:
             logger.error(f"Could not load ONNX embedding model: {e}")
@@ -105,7 +116,21 @@ class GitHubDirectIngester:
         # Connect to Milvus and setup collection
         self._connect_to_milvus()
         self._setup_enhanced_collection()
-        
+    
+    @classmethod
+    def for_processing(cls, embedding_tokenizer, embedding_session) -> "GitHubDirectIngester":
+        """Instance for CPU-side work only (analysis, chunking, embedding), as used by
+        ingestion worker processes: no Milvus connection and no GitHub access."""
+        ingester = cls.__new__(cls)
+        ingester.collection_name = None
+        ingester.model_name = None
+        ingester.github_token = None
+        ingester.embedding_tokenizer = embedding_tokenizer
+        ingester.embedding_session = embedding_session
+        ingester._init_parsing()
+        return ingester
+    
+    def _init_parsing(self):
         # Image patterns for detection
         self.image_patterns = [
             r'!\[([^\]]*)\]\(([^)]+)\)',  # Markdown images
@@ -120,38 +145,11 @@ class GitHubDirectIngester:
             '.sh', '.bat', '.ps1', '.go', '.rs', '.rb', '.php', '.sql', '.r'
         }
     
-    def _encode_text(self, text: str) -> List[float]:
-        """Encode text using ONNX embedding model"""
-        inputs = self.embedding_tokenizer(
-            text, 
-            return_tensors="np", 
-            padding=True, 
-            truncation=True, 
-            max_length=512
-        )
-        
-        onnx_inputs = {
-            "input_ids": inputs["input_ids"].astype(np.int64),
-            "attention_mask": inputs["attention_mask"].astype(np.int64)
-        }
-        
-        if "token_type_ids" in inputs:
-            onnx_inputs["token_type_ids"] = inputs["token_type_ids"].astype(np.int64)
-        
-        # Get outputs from the ONNX model
-        outputs = self.embedding_session.run(None, onnx_inputs)
-        
-        # Use mean pooling over token embeddings
-        embedding = outputs[0][0].mean(axis=0)
-        
-        # Normalize the embedding
-        norm = np.linalg.norm(embedding)
-        normalized_embedding = (embedding / norm) if norm != 0 else embedding
-        
-        return normalized_embedding.tolist()
-    
     def _connect_to_milvus(self):
         """Connect to Milvus server with retry logic, using config.py variables."""
+        if USE_LOCAL_STORE:
+            logger.info(f"Using the local vector store in {VECTOR_STORE_DIR}")
+            return
         max_retries = 3
         retry_delay = 2
 
@@ -207,8 +205,7 @@ class GitHubDirectIngester:
     def _setup_enhanced_collection(self):
         """Setup enhanced collection schema with comprehensive metadata."""
         # Get embedding dimension from ONNX model
-        sample_embedding = self._encode_text("test")
-        embedding_dim = len(sample_embedding)
+        embedding_dim = model_registry.embedding_dim()
         logger.info(f"Embedding dimension: {embedding_dim}")
         
         # Simplified schema matching retrieval service (extended to 16 fields)
@@ -259,6 +256,8 @@ class GitHubDirectIngester:
                     logger.info(f"Dropping and recreating collection '{self.collection_name}' to match new schema")
                     try:
                         utility.drop_collection(self.collection_name)
+                        lexical_indexes.drop(self.collection_name)
+                        symbol_indexes.drop(self.collection_name)
                     except Exception as drop_err:
                         logger.warning(f"Failed to drop existing collection: {drop_err}")
                     # fall through to create new
@@ -290,12 +289,8 @@ class GitHubDirectIngester:
             
             # Create indexes with retry logic
             try:
-                index_params = {
-                    "metric_type": "L2",
-                    "index_type": "IVF_FLAT",
-                    "params": {"nlist": 1024}
-                }
-                self.collection.create_index("embedding", index_params)
+                # Sized for an empty collection; _tune_vector_index grows it after ingestion
+                self.collection.create_index("embedding", index_params(0))
                 
                 # Create scalar indexes for efficient filtering
                 scalar_indexes = ["file_type", "language", "repo_name", "has_code"]
@@ -789,6 +784,11 @@ class GitHubDirectIngester:
         # Fetch file content
         logger.info(f"[PROCESS] Fetching content for: {file_info['name']}")
         content = self.fetch_file_content(file_info)
+        return self.build_chunk_metadata(file_info, content, repo_owner, repo_name, branch)
+    
+    def build_chunk_metadata(self, file_info: Dict[str, Any], content: Optional[str], repo_owner: str,
+                             repo_name: str, branch: str) -> List[Dict[str, Any]]:
+        """Analyze and chunk already fetched file content into chunk metadata dictionaries."""
         if not content or len(content.strip()) < 50:
             logger.warning(f"[PROCESS] Skipping {file_info['path']}: content too short or empty (length: {len(content) if content else 0})")
             return []
@@ -869,6 +869,8 @@ class GitHubDirectIngester:
                 'semantic_density_score': content_analysis['semantic_density_score'],
                 'information_value_score': content_analysis['information_value_score'],
                 'image_links': json.dumps(raw_chunk_images) if raw_chunk_images else '[]',
+                # Not stored in Milvus; feeds the symbol index
+                'symbols': chunk_symbols(chunk, content_analysis),
             }
             
             chunk_metadata_list.append(chunk_metadata)
@@ -878,41 +880,83 @@ class GitHubDirectIngester:
         return chunk_metadata_list
     
     def generate_embeddings_batch(self, chunks: List[str], batch_size: int = 64) -> List[List[float]]:
-        """Generate embeddings for chunks in batches using ONNX model."""
+        """Generate embeddings for chunks in length-sorted, padded ONNX batches."""
         logger.info(f"[EMBEDDINGS] Starting embedding generation for {len(chunks)} chunks")
-        logger.info(f"[EMBEDDINGS] Using batch size: {batch_size}")
+        logger.info(f"[EMBEDDINGS] Using batch size: {batch_size}, token budget: {INGEST_EMBED_MAX_BATCH_TOKENS}")
+        if not chunks:
+            return []
         
-        all_embeddings = []
-        total_batches = (len(chunks) + batch_size - 1) // batch_size
+        progress = {"next_pct": 10}
         
-        for i in range(0, len(chunks), batch_size):
-            batch_num = (i // batch_size) + 1
-            batch = chunks[i:i + batch_size]
-            batch_embeddings = []
-            
-            logger.info(f"[EMBEDDINGS] Processing batch {batch_num}/{total_batches} ({len(batch)} chunks)")
-            
-            for j, chunk in enumerate(batch):
-                try:
-                    embedding = self._encode_text(chunk)
-                    batch_embeddings.append(embedding)
-                except Exception as e:
-                    logger.warning(f"[EMBEDDINGS] Failed to generate embedding for chunk {i+j+1}: {e}")
-                    # Add zero vector as placeholder
-                    sample_embedding = self._encode_text("test")
-                    batch_embeddings.append([0.0] * len(sample_embedding))
-            
-            all_embeddings.extend(batch_embeddings)
-            
-            # Log progress every 5 batches or for the last batch
-            if batch_num % 5 == 0 or batch_num == total_batches:
-                completed_chunks = min(i + batch_size, len(chunks))
-                progress_pct = (completed_chunks / len(chunks)) * 100
-                logger.info(f"[EMBEDDINGS PROGRESS] Completed {completed_chunks}/{len(chunks)} chunks ({progress_pct:.1f}%)")
-        
-        logger.info(f"[EMBEDDINGS COMPLETE] Generated {len(all_embeddings)} embeddings successfully")
-        return all_embeddings
+        def log_progress(completed_chunks: int, total: int):
+            progress_pct = (completed_chunks / total) * 100
+            if progress_pct >= progress["next_pct"] or completed_chunks == total:
+                logger.info(f"[EMBEDDINGS PROGRESS] Completed {completed_chunks}/{total} chunks ({progress_pct:.1f}%)")
+                progress["next_pct"] = progress_pct + 10
+        
+        start = time.time()
+        try:
+            embeddings = encode_texts_sorted(
+                self.embedding_tokenizer,
+                self.embedding_session,
+                chunks,
+                max_batch_size=batch_size,
+                max_batch_tokens=INGEST_EMBED_MAX_BATCH_TOKENS,
+                on_batch=log_progress
+            )
+        except Exception as e:
+            logger.error(f"[EMBEDDINGS ERROR] Embedding generation failed: {e}")
+            # Zero vectors as placeholders
+            embeddings = np.zeros((len(chunks), model_registry.embedding_dim()), dtype=np.float32)
+        
+        elapsed = time.time() - start
+        logger.info(f"[EMBEDDINGS COMPLETE] Generated {len(chunks)} embeddings in {elapsed:.1f}s "
+                    f"({len(chunks) / max(elapsed, 1e-6):.1f} chunks/s)")
+        return embeddings.tolist()
     
+    def _warm_rerank_tokens(self, batch_metadata: List[Dict[str, Any]]):
+        """Pre-tokenize stored chunks for the reranker if it is loaded in this process."""
+        engine = model_registry.loaded_rerank_engine()
+        if engine is None:
+            return
+        try:
+            engine.warm([item['id'] for item in batch_metadata],
+                        [item['document'][:65535] for item in batch_metadata])
+        except Exception as e:
+            logger.warning(f"[STORAGE] Could not pre-tokenize chunks for reranking: {e}")
+
+    def _update_search_indexes(self, chunk_metadata_list: List[Dict[str, Any]]):
+        """Add stored chunks to the collection's BM25 and symbol indexes (one new segment each)."""
+        ids = [item['id'] for item in chunk_metadata_list]
+        try:
+            lexical_indexes.add(self.collection_name, ids,
+                                [item['document'][:65535] for item in chunk_metadata_list])
+            symbol_indexes.add(self.collection_name, ids,
+                               [item.get('symbols', {}) for item in chunk_metadata_list])
+            # Cached results were ranked without the new segments
+            collection_generations.bump(self.collection_name)
+        except Exception as e:
+            logger.warning(f"[STORAGE] Could not update the lexical/symbol indexes: {e}")
+
+    def _tune_vector_index(self):
+        """Rebuild the vector index if the collection outgrew it or VECTOR_METRIC changed.
+
+        Off by default: the rebuild releases the collection, so searches fail
+        until it is loaded again. Otherwise a drifted index is only reported.
+        """
+        if not VECTOR_INDEX_AUTO_REBUILD:
+            try:
+                report_index_drift(self.collection)
+            except Exception as e:
+                logger.warning(f"[INDEX] Could not describe the vector index: {e}")
+            return
+        try:
+            if ensure_vector_index(self.collection):
+                # Retrieval processes re-describe the index (metric, search params)
+                collection_generations.bump(self.collection_name)
+        except Exception as e:
+            logger.warning(f"[INDEX] Could not rebuild the vector index: {e}")
+
     def store_chunks_batch(self, chunk_metadata_list: List[Dict[str, Any]], 
                           embeddings: List[List[float]], batch_size: int = 100):
         """Store chunks and embeddings in Milvus."""
@@ -952,26 +996,85 @@ class GitHubDirectIngester:
             try:
                 self.collection.insert(insert_data)
                 self.collection.flush()
+                # Invalidate cached retrieval results for this collection
+                collection_generations.bump(self.collection_name)
+                self._warm_rerank_tokens(batch_metadata)
                 logger.info(f"[STORAGE] Batch {batch_num}/{total_batches} stored successfully")
             except Exception as e:
                 logger.error(f"[STORAGE ERROR] Failed to store batch {batch_num}/{total_batches}: {e}")
                 raise
-            
+        
+        self._update_search_indexes(chunk_metadata_list)
+        self._tune_vector_index()
         logger.info(f"[STORAGE COMPLETE] All {len(chunk_metadata_list)} chunks stored successfully in collection '{self.collection_name}'")
     
+    def _process_and_embed_multiprocess(self, files: List[Dict[str, Any]], repo_owner: str, repo_name: str,
+                                        branch: str, max_workers: int,
+                                        processes: int) -> Tuple[List[Dict[str, Any]], List[List[float]]]:
+        """Fetch files on I/O threads and analyze, chunk and embed them in worker processes.
+        
+        Fetched files are sent to the pool in batches of INGEST_FILES_PER_TASK; each
+        worker process owns a tokenizer and an ONNX session pinned to
+        INGEST_PROCESS_THREADS intra-op threads (default: cores / processes).
+        """
+        threads = INGEST_PROCESS_THREADS or max(1, (os.cpu_count() or 1) // processes)
+        logger.info(f"[PROCESSING] Using {processes} worker processes x {threads} ONNX threads")
+        all_chunk_metadata: List[Dict[str, Any]] = []
+        all_embeddings: List[List[float]] = []
+        processed_files = 0
+        
+        # Spawn rather than fork: the parent may already run ONNX and batcher threads
+        context = multiprocessing.get_context("spawn")
+        with ThreadPoolExecutor(max_workers=max_workers) as fetchers, ProcessPoolExecutor(
+            max_workers=processes, mp_context=context,
+            initializer=_init_processing_worker, initargs=(threads,)
+        ) as pool:
+            fetches = {fetchers.submit(self.fetch_file_content, file_info): file_info for file_info in files}
+            tasks = []
+            pending_batch = []
+            for future in concurrent.futures.as_completed(fetches):
+                file_info = fetches[future]
+                try:
+                    pending_batch.append((file_info, future.result()))
+                except Exception as e:
+                    logger.error(f"[PROCESSING ERROR] Error fetching {file_info['path']}: {e}")
+                if len(pending_batch) >= INGEST_FILES_PER_TASK:
+                    tasks.append(pool.submit(_process_files_in_worker, pending_batch, repo_owner, repo_name, branch))
+                    pending_batch = []
+            if pending_batch:
+                tasks.append(pool.submit(_process_files_in_worker, pending_batch, repo_owner, repo_name, branch))
+            
+            for task in concurrent.futures.as_completed(tasks):
+                try:
+                    chunk_metadata, embeddings, file_count = task.result()
+                except Exception as e:
+                    logger.error(f"[PROCESSING ERROR] Worker batch failed: {e}")
+                    continue
+                all_chunk_metadata.extend(chunk_metadata)
+                all_embeddings.extend(embeddings)
+                processed_files += file_count
+                progress_pct = (processed_files / len(files)) * 100
+                logger.info(f"[PROCESSING PROGRESS] {processed_files}/{len(files)} files processed ({progress_pct:.1f}%) - {len(all_chunk_metadata)} chunks embedded so far")
+        
+        return all_chunk_metadata, all_embeddings
+    
     def ingest_repository(self, repo_url: str, branch: str = "main", 
-                         max_workers: int = 8) -> Dict[str, Any]:
+                         max_workers: int = 8, processes: Optional[int] = None) -> Dict[str, Any]:
         """
         Complete repository ingestion pipeline.
         
         Args:
             repo_url: GitHub repository URL
             branch: Branch to ingest
-            max_workers: Number of parallel workers
+            max_workers: Number of parallel workers (file fetching threads)
+            processes: Worker processes for analysis, chunking and embedding
+                (default INGEST_PROCESSES; 0 keeps everything in this process)
             
         Returns:
             Ingestion results dictionary
         """
+        if processes is None:
+            processes = INGEST_PROCESSES
         start_time = time.time()
         logger.info(f"[INGESTION START] Repository: {repo_url}, Branch: {branch}")
         
@@ -992,46 +1095,60 @@ class GitHubDirectIngester:
             tree_time = time.time() - step_start
             logger.info(f"[STEP 1 COMPLETE] Repository tree fetched in {tree_time:.2f}s ({len(files)} files)")
             
-            # Step 2: Process files in parallel
-            logger.info(f"[STEP 2/4] Processing {len(files)} files in parallel (max workers: {max_workers})...")
-            step_start = time.time()
-            all_chunk_metadata = []
-            processed_files = 0
-            
-            def process_single_file(file_info):
-                return self.process_file(file_info, repo_owner, repo_name, branch)
-            
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                future_to_file = {executor.submit(process_single_file, file_info): file_info for file_info in files}
+            if processes > 0:
+                # Steps 2+3: Process and embed files in worker processes
+                logger.info(f"[STEP 2-3/4] Processing and embedding {len(files)} files in {processes} processes...")
+                step_start = time.time()
+                all_chunk_metadata, embeddings = self._process_and_embed_multiprocess(
+                    files, repo_owner, repo_name, branch, max_workers, processes
+                )
+                processing_time = time.time() - step_start
+                embedding_time = 0.0  # overlapped with processing in the workers
+                logger.info(f"[STEP 2-3 COMPLETE] Files processed and embedded in {processing_time:.2f}s ({len(all_chunk_metadata)} chunks)")
+                if not all_chunk_metadata:
+                    logger.warning("[INGESTION WARNING] No chunks generated from repository")
+                    return {'success': False, 'message': 'No processable content found'}
+            else:
+                # Step 2: Process files in parallel
+                logger.info(f"[STEP 2/4] Processing {len(files)} files in parallel (max workers: {max_workers})...")
+                step_start = time.time()
+                all_chunk_metadata = []
+                processed_files = 0
                 
-                for future in concurrent.futures.as_completed(future_to_file):
-                    try:
-                        chunk_metadata = future.result()
-                        all_chunk_metadata.extend(chunk_metadata)
-                        processed_files += 1
-                        
-                        # Log progress every 10 files
-                        if processed_files % 10 == 0 or processed_files == len(files):
-                            progress_pct = (processed_files / len(files)) * 100
-                            logger.info(f"[PROCESSING PROGRESS] {processed_files}/{len(files)} files processed ({progress_pct:.1f}%) - {len(all_chunk_metadata)} chunks generated so far")
-                    except Exception as e:
-                        file_info = future_to_file[future]
-                        logger.error(f"[PROCESSING ERROR] Error processing {file_info['path']}: {e}")
-            
-            processing_time = time.time() - step_start
-            logger.info(f"[STEP 2 COMPLETE] File processing completed in {processing_time:.2f}s ({len(all_chunk_metadata)} chunks generated)")
-            
-            if not all_chunk_metadata:
-                logger.warning("[INGESTION WARNING] No chunks generated from repository")
-                return {'success': False, 'message': 'No processable content found'}
-            
-            # Step 3: Generate embeddings
-            logger.info(f"[STEP 3/4] Generating embeddings for {len(all_chunk_metadata)} chunks...")
-            step_start = time.time()
-            chunks = [item['document'] for item in all_chunk_metadata]
-            embeddings = self.generate_embeddings_batch(chunks)
-            embedding_time = time.time() - step_start
-            logger.info(f"[STEP 3 COMPLETE] Embeddings generated in {embedding_time:.2f}s")
+                def process_single_file(file_info):
+                    return self.process_file(file_info, repo_owner, repo_name, branch)
+                
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    future_to_file = {executor.submit(process_single_file, file_info): file_info for file_info in files}
+                    
+                    for future in concurrent.futures.as_completed(future_to_file):
+                        try:
+                            chunk_metadata = future.result()
+                            all_chunk_metadata.extend(chunk_metadata)
+                            processed_files += 1
+                            
+                            # Log progress every 10 files
+                            if processed_files % 10 == 0 or processed_files == len(files):
+                                progress_pct = (processed_files / len(files)) * 100
+                                logger.info(f"[PROCESSING PROGRESS] {processed_files}/{len(files)} files processed ({progress_pct:.1f}%) - {len(all_chunk_metadata)} chunks generated so far")
+                        except Exception as e:
+                            file_info = future_to_file[future]
+                            logger.error(f"[PROCESSING ERROR] Error processing {file_info['path']}: {e}")
+                
+                processing_time = time.time() - step_start
+                logger.info(f"[STEP 2 COMPLETE] File processing completed in {processing_time:.2f}s ({len(all_chunk_metadata)} chunks generated)")
+                
+                if not all_chunk_metadata:
+                    logger.warning("[INGESTION WARNING] No chunks generated from repository")
+                    return {'success': False, 'message': 'No processable content found'}
+                
+                # Step 3: Generate embeddings
+                logger.info(f"[STEP 3/4] Generating embeddings for {len(all_chunk_metadata)} chunks...")
+                step_start = time.time()
+                chunks = [item['document'] for item in all_chunk_metadata]
+                embeddings = self.generate_embeddings_batch(chunks)
+                embedding_time = time.time() - step_start
+                logger.info(f"[STEP 3 COMPLETE] Embeddings generated in {embedding_time:.2f}s")
             
             # Step 4: Store in Milvus
             logger.info(f"[STEP 4/4] Storing {len(all_chunk_metadata)} chunks in Milvus collection '{self.collection_name}'...")
@@ -1083,6 +1200,37 @@ class GitHubDirectIngester:
             raise
 
 
+# Per-process state of ingestion worker processes (see _process_and_embed_multiprocess)
+_worker_ingester: Optional[GitHubDirectIngester] = None
+
+
+def _init_processing_worker(intra_op_threads: int):
+    """Process pool initializer: load this worker's own tokenizer and ONNX session."""
+    global _worker_ingester
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_TOKENIZER_DIR, local_files_only=True)
+    session = create_session(EMBEDDING_ONNX_PATH, intra_op_threads=intra_op_threads, inter_op_threads=1)
+    _worker_ingester = GitHubDirectIngester.for_processing(tokenizer, session)
+    logger.info(f"[WORKER {os.getpid()}] Ready with {intra_op_threads} ONNX threads")
+
+
+def _process_files_in_worker(files: List[Tuple[Dict[str, Any], Optional[str]]], repo_owner: str,
+                             repo_name: str, branch: str) -> Tuple[List[Dict[str, Any]], List[List[float]], int]:
+    """Analyze, chunk and embed a batch of fetched files inside a worker process.
+    
+    Returns (chunk metadata, embeddings, number of files handled).
+    """
+    chunk_metadata = []
+    for file_info, content in files:
+        try:
+            chunk_metadata.extend(
+                _worker_ingester.build_chunk_metadata(file_info, content, repo_owner, repo_name, branch)
+            )
+        except Exception as e:
+            logger.error(f"[PROCESSING ERROR] Error processing {file_info['path']}: {e}")
+    embeddings = _worker_ingester.generate_embeddings_batch([item['document'] for item in chunk_metadata])
+    return chunk_metadata, embeddings, len(files)
+
+
 def main():
     """Main function for command-line interface."""
     import argparse
@@ -1093,13 +1241,16 @@ def main():
         epilog="""
 Examples:
   # Ingest repository with default settings
-  python github_direct_ingester.py https://github.com/beagleboard/docs.beagleboard.io
+  python -m app.scripts.github_ingestor https://github.com/beagleboard/docs.beagleboard.io
   
   # Ingest specific branch with GitHub token
-  python github_direct_ingester.py https://github.com/owner/repo --branch develop --github-token YOUR_TOKEN
+  python -m app.scripts.github_ingestor https://github.com/owner/repo --branch develop --github-token YOUR_TOKEN
+  
+  # Chunk and embed in 4 worker processes
+  python -m app.scripts.github_ingestor https://github.com/owner/repo --processes 4
   
   # Use custom collection and model
-  python github_direct_ingester.py https://github.com/owner/repo --collection my_collection --model sentence-transformers/all-MiniLM-L6-v2
+  python -m app.scripts.github_ingestor https://github.com/owner/repo --collection my_collection --model sentence-transformers/all-MiniLM-L6-v2
         """
     )
     
@@ -1109,6 +1260,8 @@ Examples:
     parser.add_argument('--model', default='BAAI/bge-base-en-v1.5', help='Embedding model name')
     parser.add_argument('--github-token', help='GitHub API token for higher rate limits')
     parser.add_argument('--max-workers', type=int, default=8, help='Number of parallel workers')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Worker processes for chunking and embedding (default: INGEST_PROCESSES, 0 = threads only)')
     
     args = parser.parse_args()
     
@@ -1124,7 +1277,8 @@ Examples:
         result = ingester.ingest_repository(
             args.repo_url,
             args.branch,
-            args.max_workers
+            args.max_workers,
+            args.processes
         )
         
         if result['success']:
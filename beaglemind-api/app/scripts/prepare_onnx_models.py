@@ -8,34 +8,73 @@ What it does:
 - Saves tokenizers offline to:
     * onnx/embedding_tokenizer/
     * onnx/reranker_tokenizer/
+- Writes dynamically quantized INT8 variants (onnx/model.int8.onnx,
+  onnx/cross_encoder.int8.onnx) and onnx/quantization_report.json comparing
+  them with FP32: embedding cosine parity, top-k overlap of embedding and
+  reranker rankings on a sample query set, and CPU latency/throughput.
 
 Requires internet ONCE to download models and export them. After that, the
 API runs fully offline using the onnx/ directory mounted into the container.
+Quantization needs the `onnx` package (installed with optimum).
 
-Usage:
+Usage (from beaglemind-api/):
   1) python -m venv .venv && source .venv/bin/activate
   2) pip install -r dev-requirements.txt
-  3) python app/scripts/prepare_onnx_models.py
+  3) python -m app.scripts.prepare_onnx_models
 
 If you want custom paths, set env vars before running:
   EMBEDDING_MODEL=BAAI/bge-base-en-v1.5
   RERANKER_MODEL=cross-encoder/ms-marco-MiniLM-L-6-v2
   OUTPUT_DIR=onnx
+  QUANTIZE=0           (skip the INT8 variants and report)
+  REPORT_TOP_K=5
 
 """
 
+import json
 import os
 import shutil
+import statistics
 import subprocess
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Dict, Optional
 
+import numpy as np
 from transformers import AutoTokenizer
 
 
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-base-en-v1.5")
 RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
 OUTPUT_DIR = Path(os.getenv("OUTPUT_DIR", "onnx")).resolve()
+QUANTIZE = os.getenv("QUANTIZE", "1") != "0"
+REPORT_TOP_K = int(os.getenv("REPORT_TOP_K", 5))
+
+# Sample set for the parity report: each query is ranked against all passages
+SAMPLE_QUERIES = [
+    "How do I enable the PRU on BeagleBone Black?",
+    "Which pins support PWM on the BeagleBone AI-64?",
+    "How can I flash a new image to the eMMC?",
+    "What is the maximum current of the 3.3V rail?",
+    "How do I configure a device tree overlay at boot?",
+    "Connect to the board over USB serial console",
+    "Set up WiFi on BeaglePlay",
+    "Read an analog sensor with the ADC pins",
+]
+SAMPLE_PASSAGES = [
+    "The Programmable Real-time Units (PRUs) are enabled through remoteproc; load the firmware and start the core from sysfs.",
+    "PWM outputs are exposed on several header pins; use config-pin to set the pin to pwm mode before writing the period.",
+    "To flash the eMMC, boot from a microSD card holding a flasher image and wait for the LEDs to stop cycling.",
+    "The 3.3V supply on the expansion headers is limited; check the System Reference Manual for the rated current.",
+    "Device tree overlays are listed in /boot/uEnv.txt and applied by U-Boot when the board starts.",
+    "A USB serial console is available on the debug header; connect at 115200 baud with a 3.3V TTL cable.",
+    "BeaglePlay connects to wireless networks with iwctl; scan, then connect using the network name and passphrase.",
+    "The AM335x ADC accepts inputs up to 1.8V; read raw values from the IIO sysfs interface.",
+    "The BeagleBone Black includes 512MB DDR3 RAM and a 1GHz ARM Cortex-A8 processor.",
+    "GPIO pins are controlled through libgpiod; use gpioset and gpioget from the command line.",
+    "Cape EEPROMs let the board identify attached capes and load matching overlays automatically.",
+    "Debian images for Beagle boards are published on the BeagleBoard.org distros page.",
+]
 
 
 def run(cmd: list[str], cwd: Optional[Path] = None):
@@ -76,6 +115,126 @@ def save_tokenizer(model_id: str, out_dir: Path):
     tok.save_pretrained(str(out_dir))
 
 
+def quantize_int8(fp32_file: Path, int8_file: Path):
+    """Dynamic quantization: INT8 weights, activations quantized at run time."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    print(f"Quantizing {fp32_file.name} -> {int8_file.name}")
+    # Shape inference + graph cleanup first lets more MatMuls be quantized
+    prepared = int8_file.with_name(int8_file.stem + ".prep.onnx")
+    try:
+        quant_pre_process(str(fp32_file), str(prepared))
+        source = prepared
+    except Exception as e:
+        print(f"Pre-processing skipped ({e}); quantizing the exported graph as is")
+        source = fp32_file
+    try:
+        quantize_dynamic(str(source), str(int8_file), weight_type=QuantType.QInt8)
+    finally:
+        prepared.unlink(missing_ok=True)
+
+
+def _latency(run: Callable[[], Any], iterations: int = 20) -> Dict[str, float]:
+    run()  # warm-up
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {"p50_ms": statistics.median(samples), "p95_ms": samples[int(0.95 * (len(samples) - 1))]}
+
+
+def _topk_overlap(reference: np.ndarray, candidate: np.ndarray, k: int) -> float:
+    """Mean |top-k(reference) ∩ top-k(candidate)| / k over rows of two score matrices."""
+    k = min(k, reference.shape[1])
+    ref_top = np.argsort(-reference, axis=1)[:, :k]
+    cand_top = np.argsort(-candidate, axis=1)[:, :k]
+    return float(np.mean([len(set(r) & set(c)) / k for r, c in zip(ref_top, cand_top)]))
+
+
+def embedding_report(fp32_file: Path, int8_file: Path, tokenizer_dir: Path) -> Dict[str, Any]:
+    from app.services.embedding_batcher import encode_texts
+    from app.services.onnx_engine import create_session
+
+    tokenizer = AutoTokenizer.from_pretrained(str(tokenizer_dir), local_files_only=True)
+    report: Dict[str, Any] = {}
+    vectors = {}
+    for name, path in (("fp32", fp32_file), ("int8", int8_file)):
+        session = create_session(str(path), cache_dir=None)
+        queries = encode_texts(tokenizer, session, SAMPLE_QUERIES)
+        passages = encode_texts(tokenizer, session, SAMPLE_PASSAGES)
+        vectors[name] = (queries, passages)
+        batch = SAMPLE_PASSAGES * 3
+        timing = _latency(lambda: encode_texts(tokenizer, session, batch[:1]))
+        batch_ms = _latency(lambda: encode_texts(tokenizer, session, batch), iterations=5)["p50_ms"]
+        report[name] = {
+            "file_mb": path.stat().st_size / 2**20,
+            "latency_batch1": timing,
+            "throughput_texts_per_s": len(batch) / (batch_ms / 1000),
+        }
+
+    (q32, p32), (q8, p8) = vectors["fp32"], vectors["int8"]
+    cosine = np.concatenate([(q32 * q8).sum(axis=1), (p32 * p8).sum(axis=1)])
+    report["parity"] = {
+        "cosine_mean": float(cosine.mean()),
+        "cosine_min": float(cosine.min()),
+        f"top{REPORT_TOP_K}_overlap": _topk_overlap(q32 @ p32.T, q8 @ p8.T, REPORT_TOP_K),
+    }
+    return report
+
+
+def reranker_report(fp32_file: Path, int8_file: Path, tokenizer_dir: Path) -> Dict[str, Any]:
+    from app.services.onnx_engine import create_session
+    from app.services.reranker import RerankEngine
+
+    tokenizer = AutoTokenizer.from_pretrained(str(tokenizer_dir), local_files_only=True)
+    pairs = [(query, passage) for query in SAMPLE_QUERIES for passage in SAMPLE_PASSAGES]
+    report: Dict[str, Any] = {}
+    scores = {}
+    for name, path in (("fp32", fp32_file), ("int8", int8_file)):
+        engine = RerankEngine(tokenizer, create_session(str(path), cache_dir=None))
+        scores[name] = engine.score(pairs)[0].reshape(len(SAMPLE_QUERIES), len(SAMPLE_PASSAGES))
+        candidates = pairs[:30]  # one query against a typical n_results*3 candidate list
+        batch_ms = _latency(lambda: engine.score(candidates), iterations=10)
+        report[name] = {
+            "file_mb": path.stat().st_size / 2**20,
+            "latency_30_pairs": batch_ms,
+            "throughput_pairs_per_s": len(candidates) / (batch_ms["p50_ms"] / 1000),
+        }
+
+    s32, s8 = scores["fp32"], scores["int8"]
+    report["parity"] = {
+        "score_max_abs_diff": float(np.abs(s32 - s8).max()),
+        "score_correlation": float(np.corrcoef(s32.ravel(), s8.ravel())[0, 1]),
+        f"top{REPORT_TOP_K}_overlap": _topk_overlap(s32, s8, REPORT_TOP_K),
+    }
+    return report
+
+
+def write_quantization_report(out_file: Path):
+    report = {
+        "embedding": embedding_report(
+            OUTPUT_DIR / "model.onnx", OUTPUT_DIR / "model.int8.onnx", OUTPUT_DIR / "embedding_tokenizer"
+        ),
+        "reranker": reranker_report(
+            OUTPUT_DIR / "cross_encoder.onnx", OUTPUT_DIR / "cross_encoder.int8.onnx", OUTPUT_DIR / "reranker_tokenizer"
+        ),
+    }
+    out_file.write_text(json.dumps(report, indent=2))
+
+    print("\nINT8 vs FP32:")
+    for model, section in report.items():
+        parity = ", ".join(f"{key}={value:.4f}" for key, value in section["parity"].items())
+        print(f"- {model}: {parity}")
+        for variant in ("fp32", "int8"):
+            stats = section[variant]
+            speed = {key: value for key, value in stats.items() if key.startswith("throughput")}
+            print(f"    {variant}: {stats['file_mb']:.1f} MB, "
+                  + ", ".join(f"{key}={value:.1f}" for key, value in speed.items()))
+
+
 def main():
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -89,9 +248,18 @@ def main():
     export_onnx(RERANKER_MODEL, task="sequence-classification", out_file=rerank_out)
     save_tokenizer(RERANKER_MODEL, OUTPUT_DIR / "reranker_tokenizer")
 
+    # 3) INT8 dynamic-quantized variants and the FP32 parity/latency report
+    if QUANTIZE:
+        quantize_int8(emb_out, OUTPUT_DIR / "model.int8.onnx")
+        quantize_int8(rerank_out, OUTPUT_DIR / "cross_encoder.int8.onnx")
+        write_quantization_report(OUTPUT_DIR / "quantization_report.json")
+
     print("\nPrepared offline assets:")
     print(f"- Embedding ONNX:  {emb_out}")
     print(f"- Reranker ONNX:   {rerank_out}")
+    if QUANTIZE:
+        print(f"- INT8 variants:   {OUTPUT_DIR / 'model.int8.onnx'}, {OUTPUT_DIR / 'cross_encoder.int8.onnx'}")
+        print(f"- Quant report:    {OUTPUT_DIR / 'quantization_report.json'}")
     print(f"- Embedding tok:   {OUTPUT_DIR / 'embedding_tokenizer'}")
     print(f"- Reranker tok:    {OUTPUT_DIR / 'reranker_tokenizer'}")
     print("\nMount this directory into the API container at /app/onnx (read-only).\n")
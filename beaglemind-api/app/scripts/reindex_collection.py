@@ -0,0 +1,62 @@
+"""
+Rebuild a collection's vector index in place.
+
+The index type and its parameters follow the policy in
+app.services.vector_index for the collection's current row count; --metric
+migrates it between L2, IP and COSINE. Embeddings are L2-normalized, so a
+metric migration needs no re-embedding, and the retrieval service converts
+IP/COSINE similarities back to L2-equivalent distances, so scores keep their
+meaning. The collection is released while the index is rebuilt.
+
+Usage (from beaglemind-api/):
+  python -m app.scripts.reindex_collection --dry-run
+  python -m app.scripts.reindex_collection --collection beaglemind_col --metric COSINE
+  python -m app.scripts.reindex_collection --index-type HNSW --force
+"""
+
+import argparse
+import json
+import sys
+
+from app.scripts.forum_ingestor import connect_milvus
+from app.services.ingestion_events import collection_generations
+from app.services.vector_index import (
+    INDEX_TYPES, METRICS, describe_index, ensure_vector_index, index_params, needs_rebuild
+)
+from app.services.vector_store import Collection, utility
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild a collection's vector index per the index policy")
+    parser.add_argument("--collection", default="beaglemind_col", help="Collection name")
+    parser.add_argument("--index-type", choices=["auto", *INDEX_TYPES], default=None,
+                        help="Index type (default: VECTOR_INDEX_TYPE)")
+    parser.add_argument("--metric", choices=METRICS, default=None, help="Metric (default: VECTOR_METRIC)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the index matches the policy")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the current and target index")
+    args = parser.parse_args()
+
+    connect_milvus()
+    if not utility.has_collection(args.collection):
+        sys.exit(f"Collection '{args.collection}' does not exist")
+    collection = Collection(args.collection)
+    rows = collection.num_entities
+    current = describe_index(collection)
+    target = index_params(rows, args.index_type, args.metric)
+    print(f"Collection '{args.collection}': {rows} rows")
+    print(f"  current: {json.dumps(current)}")
+    print(f"  target:  {json.dumps(target)}")
+    if args.dry_run:
+        return
+    if not args.force and not needs_rebuild(current, target):
+        print("Index already matches the policy; use --force to rebuild anyway")
+        return
+
+    ensure_vector_index(collection, index_type=args.index_type, metric=args.metric, force=True)
+    # Retrieval processes re-describe the index (metric, search params) on the next request
+    collection_generations.bump(args.collection)
+    print("Index rebuilt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+In-process caches for the retrieval hot path.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+_MISSING = object()
+
+
+class LRUTTLCache:
+    """Thread-safe LRU cache with an optional per-entry time-to-live.
+
+    ``maxsize <= 0`` disables the cache; ``ttl_seconds <= 0`` keeps entries
+    until they are evicted by size.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: float = 0):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl_seconds)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if not self.enabled:
+            return default
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+def model_fingerprint(*paths: str) -> str:
+    """Cheap identity for model files: path, size and mtime of each file."""
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}")
+        except OSError:
+            parts.append(f"{path}:missing")
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_query(text: str, lowercase: bool = False) -> str:
+    """Collapse whitespace (and case, for uncased tokenizers) so trivially
+    different spellings of the same question share a cache entry."""
+    normalized = " ".join(text.split())
+    return normalized.lower() if lowercase else normalized
+
+
+class SemanticCache:
+    """Approximate-match cache over recent query embeddings.
+
+    Embeddings are kept in a fixed-capacity float32 matrix (ring buffer). A
+    lookup is one matmul against all cached rows; the best row is reused when
+    its cosine similarity reaches ``threshold`` and it was stored for the same
+    request parameters and collection generation, so a result computed before
+    an ingestion is never served after it. Embeddings must be L2-normalised.
+    """
+
+    def __init__(self, capacity: int = 512, threshold: float = 0.97):
+        self.capacity = int(capacity)
+        self.threshold = float(threshold)
+        self._matrix = None
+        self._param_ids = np.full(max(self.capacity, 0), -1, dtype=np.int64)
+        self._entries: List[Optional[tuple]] = [None] * max(self.capacity, 0)
+        # Ids of the (generation, params) keys that still have cached rows, with their row counts
+        self._param_index: Dict[Hashable, int] = {}
+        self._param_rows: Dict[Hashable, int] = {}
+        self._next_param_id = 0
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _param_id(self, params: Hashable) -> int:
+        if params not in self._param_index:
+            self._param_index[params] = self._next_param_id
+            self._param_rows[params] = 0
+            self._next_param_id += 1
+        self._param_rows[params] += 1
+        return self._param_index[params]
+
+    def _release_slot(self, slot: int):
+        """Forget the key of an overwritten row once no other row uses it."""
+        if self._entries[slot] is None:
+            return
+        params = self._entries[slot][0]
+        self._param_rows[params] -= 1
+        if not self._param_rows[params]:
+            del self._param_rows[params]
+            del self._param_index[params]
+
+    def lookup(self, embedding: np.ndarray, params: Hashable,
+               generation: Hashable = None) -> Optional[Tuple[Any, float, str]]:
+        """Return (value, similarity, original_query) for the closest match, or None."""
+        if not self.enabled:
+            return None
+        params = (generation, params)
+        with self._lock:
+            if self._size == 0 or params not in self._param_index:
+                self.misses += 1
+                return None
+            similarities = self._matrix[:self._size] @ embedding
+            similarities[self._param_ids[:self._size] != self._param_index[params]] = -np.inf
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            _, query, value = self._entries[best]
+            return value, similarity, query
+
+    def add(self, embedding: np.ndarray, params: Hashable, query: str, value: Any,
+            generation: Hashable = None):
+        """Store ``value`` under the generation it was computed at."""
+        if not self.enabled:
+            return
+        params = (generation, params)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.capacity, embedding.shape[-1]), dtype=np.float32)
+            slot = self._next
+            self._release_slot(slot)
+            self._matrix[slot] = embedding
+            self._param_ids[slot] = self._param_id(params)
+            self._entries[slot] = (params, query, value)
+            self._next = (slot + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def clear(self):
+        with self._lock:
+            self._entries = [None] * max(self.capacity, 0)
+            self._param_ids[:] = -1
+            self._param_index.clear()
+            self._param_rows.clear()
+            self._next = 0
+            self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": self._size,
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
@@ -0,0 +1,232 @@
+"""
+Embedding Micro-Batcher
+
+Coalesces concurrent single-query embedding requests into one padded ONNX
+batch so that N simultaneous callers share a single forward pass. Bulk
+encoding (ingestion) goes through ``encode_texts_sorted``, which sorts texts
+by token length and runs padded batches under a token budget.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def encode_texts(tokenizer, session, texts: List[str], max_length: int = 512,
+                 pad_to_multiple_of: Optional[int] = None) -> np.ndarray:
+    """Encode a list of texts in one padded ONNX run.
+
+    Returns a float32 array of shape (len(texts), dim) holding L2-normalised,
+    attention-masked mean-pooled embeddings. For a single text this matches the
+    original per-text encoding exactly. ``pad_to_multiple_of`` rounds the padded
+    width up (padding is masked out of the pooling) so input shapes repeat.
+    """
+    inputs = tokenizer(
+        texts,
+        return_tensors="np",
+        padding=True,
+        truncation=True,
+        max_length=max_length,
+        pad_to_multiple_of=pad_to_multiple_of or None
+    )
+
+    onnx_inputs = {
+        "input_ids": inputs["input_ids"].astype(np.int64),
+        "attention_mask": inputs["attention_mask"].astype(np.int64)
+    }
+
+    if "token_type_ids" in inputs:
+        onnx_inputs["token_type_ids"] = inputs["token_type_ids"].astype(np.int64)
+
+    return _run_and_pool(session, onnx_inputs)
+
+
+def _run_and_pool(session, onnx_inputs) -> np.ndarray:
+    outputs = session.run(None, onnx_inputs)
+
+    # Mean pooling over real (non-padding) tokens only
+    token_embeddings = outputs[0].astype(np.float32)
+    mask = onnx_inputs["attention_mask"][..., np.newaxis].astype(np.float32)
+    summed = (token_embeddings * mask).sum(axis=1)
+    counts = np.clip(mask.sum(axis=1), 1.0, None)
+    embeddings = summed / counts
+
+    # Normalize each row
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+def length_sorted_batches(lengths: Sequence[int], max_batch_size: int,
+                          max_batch_tokens: int) -> List[List[int]]:
+    """Group indices (shortest first) so each batch's padded size
+    (rows x longest row) stays within ``max_batch_tokens``."""
+    order = np.argsort(lengths, kind="stable")
+    batches: List[List[int]] = []
+    current: List[int] = []
+    for idx in order:
+        longest = lengths[idx]  # sorted ascending, so the newest item is the longest
+        if current and (
+            len(current) >= max_batch_size
+            or (len(current) + 1) * longest > max_batch_tokens
+        ):
+            batches.append(current)
+            current = []
+        current.append(int(idx))
+    if current:
+        batches.append(current)
+    return batches
+
+
+def encode_texts_sorted(tokenizer, session, texts: List[str], max_batch_size: int = 64,
+                        max_batch_tokens: int = 16384, max_length: int = 512,
+                        on_batch=None) -> np.ndarray:
+    """Encode many texts with minimal padding.
+
+    Texts are tokenized once, sorted by token length and run in padded
+    batches bounded by ``max_batch_size`` rows and ``max_batch_tokens``
+    padded tokens. Rows come back in the original order; the pooling matches
+    ``encode_texts``. A failing batch is retried text by text, and texts
+    that still fail get a zero vector. ``on_batch(done, total)`` is called
+    after every batch.
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    token_ids = tokenizer(texts, truncation=True, max_length=max_length)["input_ids"]
+    lengths = [len(ids) for ids in token_ids]
+    input_names = {i.name for i in session.get_inputs()}
+    pad_id = tokenizer.pad_token_id or 0
+
+    embeddings: Optional[np.ndarray] = None
+    failed: List[int] = []
+    done = 0
+    for batch in length_sorted_batches(lengths, max(1, int(max_batch_size)), max(1, int(max_batch_tokens))):
+        width = max(lengths[i] for i in batch)
+        input_ids = np.full((len(batch), width), pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(batch), width), dtype=np.int64)
+        for row, i in enumerate(batch):
+            input_ids[row, :lengths[i]] = token_ids[i]
+            attention_mask[row, :lengths[i]] = 1
+        onnx_inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in input_names:
+            onnx_inputs["token_type_ids"] = np.zeros_like(input_ids)
+
+        try:
+            pooled = _run_and_pool(session, onnx_inputs)
+        except Exception as e:
+            logger.warning(f"[EMBEDDINGS] Batch of {len(batch)} failed ({e}); retrying one by one")
+            failed.extend(batch)
+        else:
+            if embeddings is None:
+                embeddings = np.zeros((len(texts), pooled.shape[-1]), dtype=np.float32)
+            embeddings[batch] = pooled
+        done += len(batch)
+        if on_batch is not None:
+            on_batch(done, len(texts))
+
+    for i in failed:
+        try:
+            row = encode_texts(tokenizer, session, [texts[i]], max_length)[0]
+        except Exception as e:
+            logger.warning(f"[EMBEDDINGS] Could not encode text {i}: {e}")
+            continue
+        if embeddings is None:
+            embeddings = np.zeros((len(texts), row.shape[-1]), dtype=np.float32)
+        embeddings[i] = row
+    if embeddings is None:
+        raise RuntimeError("Every embedding batch failed")
+    return embeddings
+
+
+class EmbeddingBatcher:
+    """Request-coalescing scheduler in front of an ONNX embedding session.
+
+    Callers block on ``encode`` while a single worker thread gathers queued
+    texts for up to ``max_wait_ms`` (or until ``max_batch_size`` texts are
+    waiting), runs them through the session as one batch, and hands each
+    caller its own row.
+    """
+
+    def __init__(self, tokenizer, session, max_batch_size: int = 16,
+                 max_wait_ms: float = 3.0, max_length: int = 512,
+                 pad_to_multiple_of: Optional[int] = None):
+        self.tokenizer = tokenizer
+        self.session = session
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_length = max_length
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+        # Counters exposed for diagnostics
+        self.batches_run = 0
+        self.texts_encoded = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch_size > 1 and self.max_wait > 0
+
+    def encode(self, text: str) -> List[float]:
+        """Encode a single text, sharing a forward pass with concurrent callers."""
+        if not self.enabled:
+            return encode_texts(
+                self.tokenizer, self.session, [text], self.max_length, self.pad_to_multiple_of
+            )[0].tolist()
+
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def _collect_batch(self) -> List[Tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = encode_texts(
+                    self.tokenizer, self.session, texts, self.max_length, self.pad_to_multiple_of
+                )
+            except Exception as e:
+                logger.warning(f"[BATCHER] Batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches_run += 1
+            self.texts_encoded += len(batch)
+            for row, (_, future) in zip(embeddings, batch):
+                future.set_result(row.tolist())
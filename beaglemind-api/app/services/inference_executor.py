@@ -0,0 +1,71 @@
+"""
+Bounded Inference Executor
+
+Runs blocking retrieval work (tokenizer, ONNX sessions, Milvus search) off the
+event loop on a dedicated thread pool with a fixed admission limit, so that a
+burst of slow queries is rejected quickly instead of queueing without bound.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when the executor already holds its maximum number of tasks."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Retrieval executor is saturated, retry later")
+        self.retry_after = retry_after
+
+
+class BoundedInferenceExecutor:
+    """Thread pool that admits at most ``max_workers + queue_depth`` tasks."""
+
+    def __init__(self, max_workers: int = 4, queue_depth: int = 32, retry_after: int = 1):
+        self.max_workers = max(1, int(max_workers))
+        self.queue_depth = max(0, int(queue_depth))
+        self.retry_after = max(1, int(retry_after))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="retrieval"
+        )
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.queue_depth)
+
+        # Counters exposed for diagnostics
+        self.rejected = 0
+        self._in_flight = 0
+        self._counter_lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``fn`` on the pool, raising ExecutorSaturatedError if it is full."""
+        if not self._slots.acquire(blocking=False):
+            with self._counter_lock:
+                self.rejected += 1
+            logger.warning(f"[EXECUTOR] Rejecting task: {self._in_flight} tasks in flight")
+            raise ExecutorSaturatedError(self.retry_after)
+
+        with self._counter_lock:
+            self._in_flight += 1
+
+        def release(_):
+            with self._counter_lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            release(None)
+            raise
+        # Release the slot when the work finishes, even if the caller was cancelled
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
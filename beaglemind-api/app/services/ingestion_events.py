@@ -0,0 +1,61 @@
+"""
+Ingestion Generation Tracking
+
+Every insert into a collection bumps that collection's generation. Retrieval
+caches key their entries on the generation they were computed under, so any
+ingestion (in this process or in a separate ingestor process) makes them stale.
+
+The in-process counter covers the API's own GitHub ingestion; a marker file
+per collection under INGESTION_STATE_DIR covers out-of-process ingestors such
+as the forum importer.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+from app.config import INGESTION_STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionGenerations:
+    """Per-collection generation counters shared across processes."""
+
+    def __init__(self, state_dir: str):
+        self.state_dir = Path(state_dir)
+        self._local: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _marker(self, collection_name: str) -> Path:
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]', '_', collection_name)
+        return self.state_dir / f"{safe_name}.generation"
+
+    def bump(self, collection_name: str):
+        """Record that new data was written to ``collection_name``."""
+        with self._lock:
+            self._local[collection_name] = self._local.get(collection_name, 0) + 1
+        try:
+            marker = self._marker(collection_name)
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            marker.touch()
+            now = time.time_ns()
+            os.utime(marker, ns=(now, now))
+        except OSError as e:
+            logger.warning(f"[GENERATION] Could not update marker for '{collection_name}': {e}")
+
+    def current(self, collection_name: str) -> Tuple[int, int]:
+        """Opaque generation token; it changes whenever the collection is written."""
+        try:
+            marker_ns = self._marker(collection_name).stat().st_mtime_ns
+        except OSError:
+            marker_ns = 0
+        return self._local.get(collection_name, 0), marker_ns
+
+
+# Global tracker instance
+collection_generations = CollectionGenerations(INGESTION_STATE_DIR)
@@ -0,0 +1,167 @@
+"""
+BM25 Lexical Index
+
+Inverted index over chunk ``document`` text for exact identifiers that dense
+embeddings blur (pin names like P9_14, overlay names, ``config-pin`` flags).
+
+Ingestors append one immutable segment per write under LEXICAL_INDEX_DIR
+(``<collection>/<segment>.npz``: chunk ids, document lengths and a CSR term ->
+postings layout); see ``segment_store`` for merging, reloading and compaction.
+"""
+
+import logging
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.config import LEXICAL_INDEX_DIR, LEXICAL_MAX_SEGMENTS, BM25_K1, BM25_B
+from app.services.segment_store import SegmentStore
+
+logger = logging.getLogger(__name__)
+
+# Words, optionally joined by identifier punctuation: P9_14, config-pin, am335x-boneblack.dtb
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[_\-.:/][a-z0-9]+)*")
+_PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound identifiers also yield their parts."""
+    terms = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group(0)
+        terms.append(token)
+        parts = _PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+def _pack(ids: Sequence[str], lengths: np.ndarray,
+          postings: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """CSR arrays for one segment: postings of term i are [offsets[i], offsets[i+1])."""
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[term][0]) for term in terms])
+    return {
+        "ids": np.frombuffer("\n".join(ids).encode("utf-8"), dtype=np.uint8),
+        "terms": np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+        "lengths": np.asarray(lengths, dtype=np.int32),
+        "offsets": offsets,
+        "docs": np.concatenate([postings[term][0] for term in terms] or [np.zeros(0)]).astype(np.int32),
+        "tfs": np.concatenate([postings[term][1] for term in terms] or [np.zeros(0)]).astype(np.uint16),
+    }
+
+
+def _segment_arrays(ids: Sequence[str], texts: Sequence[str]) -> Dict[str, np.ndarray]:
+    term_docs: Dict[str, Tuple[List[int], List[int]]] = {}
+    lengths = np.zeros(len(texts), dtype=np.int32)
+    for doc, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        lengths[doc] = sum(counts.values())
+        for term, tf in counts.items():
+            docs, tfs = term_docs.setdefault(term, ([], []))
+            docs.append(doc)
+            tfs.append(min(tf, 65535))
+    postings = {term: (np.array(docs), np.array(tfs)) for term, (docs, tfs) in term_docs.items()}
+    return _pack(ids, lengths, postings)
+
+
+def _split(buffer: np.ndarray) -> List[str]:
+    text = buffer.tobytes().decode("utf-8")
+    return text.split("\n") if text else []
+
+
+def _merge(segments: List[Dict[str, np.ndarray]]) -> Tuple[List[str], np.ndarray,
+                                                         Dict[str, Tuple[np.ndarray, np.ndarray]]]:
+    """Concatenate segments, renumbering documents; returns (ids, lengths, postings)."""
+    ids: List[str] = []
+    lengths = []
+    parts: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+    for segment in segments:
+        base = len(ids)
+        ids.extend(_split(segment["ids"]))
+        lengths.append(segment["lengths"])
+        offsets, docs, tfs = segment["offsets"], segment["docs"], segment["tfs"]
+        for i, term in enumerate(_split(segment["terms"])):
+            start, end = offsets[i], offsets[i + 1]
+            parts.setdefault(term, []).append((docs[start:end] + base, tfs[start:end]))
+    postings = {
+        term: (np.concatenate([d for d, _ in chunks]), np.concatenate([t for _, t in chunks]))
+        for term, chunks in parts.items()
+    }
+    return ids, np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int32), postings
+
+
+class BM25Index:
+    """Read-only BM25 scorer over the merged segments of one collection."""
+
+    def __init__(self, ids: List[str], lengths: np.ndarray,
+                 postings: Dict[str, Tuple[np.ndarray, np.ndarray]],
+                 k1: float = BM25_K1, b: float = BM25_B):
+        self.ids = ids
+        self.lengths = lengths.astype(np.float32)
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.avg_length = float(self.lengths.mean()) if len(ids) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_segments(cls, segments: List[Dict[str, np.ndarray]]) -> "BM25Index":
+        ids, lengths, postings = _merge(segments)
+        return cls(ids, lengths, {term: (docs, tfs.astype(np.float32)) for term, (docs, tfs) in postings.items()})
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        """Top ``limit`` (chunk id, BM25 score) pairs, best first."""
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term in self.postings]
+        if not terms or limit <= 0:
+            return []
+        n_docs = len(self.ids)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        norm = self.k1 * (1.0 - self.b + self.b * self.lengths / max(self.avg_length, 1e-6))
+        for term in terms:
+            docs, tfs = self.postings[term]
+            idf = np.log(1.0 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            # A chunk id is only ever in one segment, so docs has no duplicates
+            scores[docs] += idf * tfs * (self.k1 + 1.0) / (tfs + norm[docs])
+        matched = np.flatnonzero(scores)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        order = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in order]
+
+
+class LexicalIndexStore(SegmentStore):
+    """BM25 segments (npz, CSR postings) per collection."""
+
+    suffix = ".npz"
+    label = "LEXICAL"
+
+    def read_segment(self, path: Path) -> Dict[str, np.ndarray]:
+        with np.load(path) as segment:
+            return {key: segment[key] for key in segment.files}
+
+    def write_segment(self, f, segment: Dict[str, np.ndarray]):
+        np.savez(f, **segment)
+
+    def merge_segments(self, segments: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        return _pack(*_merge(segments))
+
+    def build_index(self, segments: List[Dict[str, np.ndarray]]) -> BM25Index:
+        return BM25Index.from_segments(segments)
+
+    def add(self, collection_name: str, ids: Sequence[str], texts: Sequence[str]):
+        """Index newly stored chunks as a new segment."""
+        if not ids:
+            return
+        self.append(collection_name, _segment_arrays(ids, texts))
+        logger.info(f"[LEXICAL] Indexed {len(ids)} chunks for '{collection_name}'")
+
+
+# Global store instance
+lexical_indexes = LexicalIndexStore(LEXICAL_INDEX_DIR, LEXICAL_MAX_SEGMENTS)
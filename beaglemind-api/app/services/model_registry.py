@@ -0,0 +1,134 @@
+"""
+Model Registry
+
+Process-wide owner of the offline ONNX sessions and tokenizers. Retrieval
+services (one per collection) and both ingestors get their handles from here,
+so each model is loaded once per process and the embedding fingerprint and
+dimension are computed once.
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import onnxruntime as ort
+from transformers import AutoTokenizer
+
+from app.config import (
+    EMBEDDING_ONNX_PATH, RERANKER_ONNX_PATH, EMBEDDING_TOKENIZER_DIR, RERANKER_TOKENIZER_DIR,
+    EMBED_BATCH_WINDOW_MS, EMBED_MAX_BATCH_SIZE,
+    RERANK_DOC_TOKEN_CAP, RERANK_MAX_BATCH_TOKENS, RERANK_MAX_BATCH_SIZE, DOC_TOKEN_CACHE_SIZE,
+    EMBED_IO_BINDING, EMBED_PAD_TO_MULTIPLE
+)
+from app.services.cache import LRUTTLCache, model_fingerprint
+from app.services.embedding_batcher import EmbeddingBatcher, encode_texts
+from app.services.onnx_engine import IOBoundSession, create_session
+from app.services.reranker import RerankEngine
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """Lazily loads and caches tokenizers, ONNX sessions and derived metadata."""
+
+    def __init__(self):
+        self._tokenizers: Dict[str, Any] = {}
+        self._sessions: Dict[str, ort.InferenceSession] = {}
+        self._embedding_batcher: Optional[EmbeddingBatcher] = None
+        self._rerank_engine: Optional[RerankEngine] = None
+        self._embedding_dim: Optional[int] = None
+        self._embedding_fingerprint: Optional[str] = None
+        self._reranker_fingerprint: Optional[str] = None
+        self._lock = threading.RLock()
+
+    def tokenizer(self, path: str):
+        """Load (once) the tokenizer stored under ``path`` (offline only)."""
+        with self._lock:
+            if path not in self._tokenizers:
+                logger.info(f"[MODELS] Loading tokenizer from {path}")
+                self._tokenizers[path] = AutoTokenizer.from_pretrained(path, local_files_only=True)
+            return self._tokenizers[path]
+
+    def session(self, path: str) -> ort.InferenceSession:
+        """Load (once) the ONNX model at ``path`` with the configured session options."""
+        with self._lock:
+            if path not in self._sessions:
+                logger.info(f"[MODELS] Loading ONNX session from {path}")
+                self._sessions[path] = create_session(path)
+            return self._sessions[path]
+
+    def embedding_model(self) -> Tuple[Any, ort.InferenceSession]:
+        return self.tokenizer(EMBEDDING_TOKENIZER_DIR), self.session(EMBEDDING_ONNX_PATH)
+
+    def reranker_model(self) -> Tuple[Any, ort.InferenceSession]:
+        return self.tokenizer(RERANKER_TOKENIZER_DIR), self.session(RERANKER_ONNX_PATH)
+
+    def embedding_batcher(self) -> EmbeddingBatcher:
+        """Shared query micro-batcher, so concurrent queries on any collection coalesce."""
+        with self._lock:
+            if self._embedding_batcher is None:
+                tokenizer, session = self.embedding_model()
+                pad_to_multiple_of = None
+                if EMBED_IO_BINDING:
+                    # Query shapes repeat once padded to a multiple, so output buffers are reused
+                    session = IOBoundSession(session)
+                    pad_to_multiple_of = EMBED_PAD_TO_MULTIPLE
+                self._embedding_batcher = EmbeddingBatcher(
+                    tokenizer,
+                    session,
+                    max_batch_size=EMBED_MAX_BATCH_SIZE,
+                    max_wait_ms=EMBED_BATCH_WINDOW_MS,
+                    pad_to_multiple_of=pad_to_multiple_of
+                )
+            return self._embedding_batcher
+
+    def rerank_engine(self) -> RerankEngine:
+        """Shared length-bucketed cross-encoder scorer."""
+        with self._lock:
+            if self._rerank_engine is None:
+                tokenizer, session = self.reranker_model()
+                self._rerank_engine = RerankEngine(
+                    tokenizer,
+                    session,
+                    doc_token_cap=RERANK_DOC_TOKEN_CAP,
+                    max_batch_tokens=RERANK_MAX_BATCH_TOKENS,
+                    max_batch_size=RERANK_MAX_BATCH_SIZE,
+                    doc_token_cache=LRUTTLCache(maxsize=DOC_TOKEN_CACHE_SIZE)
+                )
+            return self._rerank_engine
+
+    def loaded_rerank_engine(self) -> Optional[RerankEngine]:
+        """The rerank engine if this process has already loaded it, else None."""
+        return self._rerank_engine
+
+    def embedding_fingerprint(self) -> str:
+        with self._lock:
+            if self._embedding_fingerprint is None:
+                self._embedding_fingerprint = model_fingerprint(
+                    EMBEDDING_ONNX_PATH, f"{EMBEDDING_TOKENIZER_DIR}/tokenizer.json"
+                )
+            return self._embedding_fingerprint
+
+    def reranker_fingerprint(self) -> str:
+        with self._lock:
+            if self._reranker_fingerprint is None:
+                self._reranker_fingerprint = model_fingerprint(
+                    RERANKER_ONNX_PATH, f"{RERANKER_TOKENIZER_DIR}/tokenizer.json"
+                )
+            return self._reranker_fingerprint
+
+    def embedding_dim(self) -> int:
+        """Embedding width, read from the ONNX output shape or probed once."""
+        with self._lock:
+            if self._embedding_dim is None:
+                tokenizer, session = self.embedding_model()
+                dim = session.get_outputs()[0].shape[-1]
+                if not isinstance(dim, int):
+                    dim = int(encode_texts(tokenizer, session, ["test"]).shape[-1])
+                self._embedding_dim = dim
+                logger.info(f"[MODELS] Embedding dimension: {dim}")
+            return self._embedding_dim
+
+
+# Global registry instance
+model_registry = ModelRegistry()
@@ -0,0 +1,162 @@
+"""
+ONNX Runtime Inference Engine
+
+Builds every InferenceSession from one set of SessionOptions: intra/inter-op
+thread counts, execution mode and graph optimization level come from config.
+With optimization enabled, the optimized graph is written once under
+ORT_OPTIMIZED_MODEL_DIR (keyed by the source model's fingerprint and the
+level) and later processes load it directly, skipping graph rewriting.
+
+``IOBoundSession`` optionally wraps a session so repeated runs with the same
+input shapes write into preallocated, per-thread output buffers via IOBinding.
+"""
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import onnxruntime as ort
+
+from app.config import (
+    ORT_INTRA_OP_THREADS, ORT_INTER_OP_THREADS, ORT_EXECUTION_MODE,
+    ORT_GRAPH_OPTIMIZATION, ORT_OPTIMIZED_MODEL_DIR
+)
+from app.services.cache import model_fingerprint
+
+logger = logging.getLogger(__name__)
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def session_options(intra_op_threads: int = ORT_INTRA_OP_THREADS,
+                    inter_op_threads: int = ORT_INTER_OP_THREADS,
+                    execution_mode: str = ORT_EXECUTION_MODE,
+                    graph_optimization: str = ORT_GRAPH_OPTIMIZATION) -> ort.SessionOptions:
+    """SessionOptions for the given settings (thread counts of 0 keep ORT's defaults)."""
+    if execution_mode not in EXECUTION_MODES:
+        raise ValueError(f"Unknown ORT execution mode: {execution_mode}")
+    if graph_optimization not in GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(f"Unknown ORT graph optimization level: {graph_optimization}")
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = max(0, int(intra_op_threads))
+    options.inter_op_num_threads = max(0, int(inter_op_threads))
+    options.execution_mode = EXECUTION_MODES[execution_mode]
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+    return options
+
+
+def optimized_model_path(model_path: str, graph_optimization: str,
+                         cache_dir: Optional[str] = ORT_OPTIMIZED_MODEL_DIR) -> Optional[Path]:
+    """Where the optimized graph for ``model_path`` is cached, or None if caching is off."""
+    if not cache_dir or graph_optimization == "disable":
+        return None
+    stem = Path(model_path).stem
+    return Path(cache_dir) / f"{stem}.{graph_optimization}.{model_fingerprint(model_path)}.onnx"
+
+
+def create_session(model_path: str, intra_op_threads: int = ORT_INTRA_OP_THREADS,
+                   inter_op_threads: int = ORT_INTER_OP_THREADS,
+                   execution_mode: str = ORT_EXECUTION_MODE,
+                   graph_optimization: str = ORT_GRAPH_OPTIMIZATION,
+                   cache_dir: Optional[str] = ORT_OPTIMIZED_MODEL_DIR) -> ort.InferenceSession:
+    """Create a CPU session, reusing (or producing) the on-disk optimized graph."""
+    options = session_options(intra_op_threads, inter_op_threads, execution_mode, graph_optimization)
+    cached = optimized_model_path(model_path, graph_optimization, cache_dir)
+
+    if cached is not None and cached.exists():
+        logger.info(f"[ORT] Loading pre-optimized graph {cached}")
+        # Already rewritten at this level; don't pay for optimization again
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        return ort.InferenceSession(str(cached), sess_options=options, providers=["CPUExecutionProvider"])
+
+    tmp_path = None
+    if cached is not None:
+        try:
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a per-process temp file so concurrent starts never see a partial graph
+            tmp_path = cached.with_name(f"{cached.name}.{os.getpid()}.tmp")
+            options.optimized_model_filepath = str(tmp_path)
+        except OSError as e:
+            logger.warning(f"[ORT] Optimized graph cache unavailable: {e}")
+            tmp_path = None
+
+    try:
+        session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+    except Exception as e:
+        if tmp_path is None:
+            raise
+        logger.warning(f"[ORT] Could not write optimized graph ({e}); loading without caching it")
+        options = session_options(intra_op_threads, inter_op_threads, execution_mode, graph_optimization)
+        session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        tmp_path = None
+    if tmp_path is not None and tmp_path.exists():
+        try:
+            os.replace(tmp_path, cached)
+            logger.info(f"[ORT] Cached optimized graph at {cached}")
+        except OSError as e:
+            logger.warning(f"[ORT] Could not cache optimized graph: {e}")
+    return session
+
+
+class IOBoundSession:
+    """InferenceSession wrapper that runs through IOBinding into reused output buffers.
+
+    The first run for a given set of input shapes goes through ``session.run``
+    to learn the output shapes; later runs with the same shapes bind inputs and
+    preallocated outputs directly. Buffers are per thread, and the arrays
+    returned by ``run`` are only valid until that thread's next run with the
+    same shapes, so callers must consume (or copy) them immediately.
+    """
+
+    def __init__(self, session: ort.InferenceSession, max_shapes: int = 32):
+        self.session = session
+        self.max_shapes = max(1, int(max_shapes))
+        self.output_names = [output.name for output in session.get_outputs()]
+        self._local = threading.local()
+
+    def get_inputs(self):
+        return self.session.get_inputs()
+
+    def get_outputs(self):
+        return self.session.get_outputs()
+
+    def _buffers(self) -> Dict[Tuple, List[np.ndarray]]:
+        if not hasattr(self._local, "buffers"):
+            self._local.buffers = {}
+        return self._local.buffers
+
+    def run(self, output_names: Optional[List[str]], inputs: Dict[str, np.ndarray]) -> List[Any]:
+        names = output_names or self.output_names
+        key = tuple(names) + tuple((name, value.shape) for name, value in sorted(inputs.items()))
+        buffers = self._buffers()
+        outputs = buffers.get(key)
+        if outputs is None:
+            results = self.session.run(names, inputs)
+            if len(buffers) >= self.max_shapes:
+                buffers.pop(next(iter(buffers)))
+            buffers[key] = [np.empty_like(result) for result in results]
+            return results
+
+        binding = self.session.io_binding()
+        for name, value in inputs.items():
+            binding.bind_cpu_input(name, np.ascontiguousarray(value))
+        for name, buffer in zip(names, outputs):
+            binding.bind_output(
+                name, "cpu", 0, buffer.dtype, list(buffer.shape), buffer.ctypes.data
+            )
+        self.session.run_with_iobinding(binding)
+        return outputs
@@ -0,0 +1,155 @@
+"""
+Cross-Encoder Rerank Engine
+
+Scores (query, document) pairs with the ONNX cross-encoder while paying only
+for real tokens: queries and documents are tokenized separately, documents are
+capped at a configurable token budget, pairs are assembled as BERT-style
+``[CLS] query [SEP] doc [SEP]`` sequences, sorted by length and run in
+micro-batches bounded by a padded-token budget.
+
+Chunk texts never change after ingestion, so document token ids are cached by
+chunk id and only the query has to be tokenized on a warm path.
+"""
+
+import logging
+import time
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.cache import LRUTTLCache
+from app.services.embedding_batcher import length_sorted_batches
+
+logger = logging.getLogger(__name__)
+
+
+class RerankEngine:
+    """Length-bucketed, truncation-aware scoring of (query, doc) pairs."""
+
+    def __init__(self, tokenizer, session, max_length: int = 512, doc_token_cap: int = 256,
+                 max_batch_tokens: int = 8192, max_batch_size: int = 32,
+                 doc_token_cache: Optional[LRUTTLCache] = None):
+        self.tokenizer = tokenizer
+        self.session = session
+        self.max_length = max_length
+        self.doc_token_cap = max(1, int(doc_token_cap))
+        self.max_batch_tokens = max(1, int(max_batch_tokens))
+        self.max_batch_size = max(1, int(max_batch_size))
+
+        self.cls_id = tokenizer.cls_token_id
+        self.sep_id = tokenizer.sep_token_id
+        self.pad_id = tokenizer.pad_token_id or 0
+        self.input_names = {i.name for i in session.get_inputs()}
+        self.doc_token_cache = doc_token_cache if doc_token_cache is not None else LRUTTLCache(maxsize=0)
+
+    def tokenize(self, texts: List[str], cap: int) -> List[List[int]]:
+        """Token ids without special tokens, each truncated to ``cap``."""
+        if not texts:
+            return []
+        encoded = self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            truncation=True,
+            max_length=cap
+        )
+        return [list(ids) for ids in encoded["input_ids"]]
+
+    def _doc_room(self, query_ids: Sequence[int], doc_ids: Sequence[int]) -> int:
+        """Document tokens that fit next to the query within ``max_length``."""
+        return max(0, min(len(doc_ids), self.max_length - len(query_ids) - 3))
+
+    def _fill_row(self, row: int, query_ids: Sequence[int], doc_ids: Sequence[int],
+                  input_ids: np.ndarray, attention_mask: np.ndarray, token_type_ids: np.ndarray):
+        """Write one ``[CLS] q [SEP] d [SEP]`` sequence into row ``row`` of the batch."""
+        q_len = len(query_ids)
+        d_len = self._doc_room(query_ids, doc_ids)
+        total = q_len + d_len + 3
+        input_ids[row, 0] = self.cls_id
+        input_ids[row, 1:1 + q_len] = query_ids
+        input_ids[row, 1 + q_len] = self.sep_id
+        input_ids[row, 2 + q_len:2 + q_len + d_len] = doc_ids[:d_len]
+        input_ids[row, total - 1] = self.sep_id
+        attention_mask[row, :total] = 1
+        token_type_ids[row, q_len + 2:total] = 1
+
+    def _micro_batches(self, lengths: Sequence[int]) -> List[List[int]]:
+        """Group pair indices (shortest first) so padded tokens stay within budget."""
+        return length_sorted_batches(lengths, self.max_batch_size, self.max_batch_tokens)
+
+    def score_tokenized(self, query_ids: Sequence[List[int]],
+                        doc_ids: Sequence[List[int]]) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """Score pre-tokenized pairs; returns (scores in input order, stats)."""
+        lengths = [len(q) + self._doc_room(q, d) + 3 for q, d in zip(query_ids, doc_ids)]
+        scores = np.zeros(len(lengths), dtype=np.float32)
+        padded_tokens = 0
+        batches = self._micro_batches(lengths)
+
+        start = time.perf_counter()
+        for batch in batches:
+            width = max(lengths[i] for i in batch)
+            input_ids = np.full((len(batch), width), self.pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(batch), width), dtype=np.int64)
+            token_type_ids = np.zeros((len(batch), width), dtype=np.int64)
+            for row, i in enumerate(batch):
+                self._fill_row(row, query_ids[i], doc_ids[i], input_ids, attention_mask, token_type_ids)
+            padded_tokens += input_ids.size
+
+            onnx_inputs = {'input_ids': input_ids, 'attention_mask': attention_mask}
+            if 'token_type_ids' in self.input_names:
+                onnx_inputs['token_type_ids'] = token_type_ids
+            outputs = self.session.run(None, onnx_inputs)
+            scores[batch] = outputs[0].reshape(len(batch), -1)[:, 0]
+
+        stats = {
+            "pairs": len(lengths),
+            "batches": len(batches),
+            "tokens": int(sum(lengths)),
+            "padded_tokens": int(padded_tokens),
+            "inference_ms": (time.perf_counter() - start) * 1000,
+        }
+        return scores, stats
+
+    def doc_tokens(self, docs: List[str],
+                   keys: Optional[List[Hashable]] = None) -> Tuple[List[List[int]], int]:
+        """Token ids for ``docs``, reusing cached ids for keyed (chunk id) documents.
+
+        Returns (token ids per doc, number served from the cache).
+        """
+        tokens: List[Optional[List[int]]] = [None] * len(docs)
+        missing = []
+        for i in range(len(docs)):
+            key = keys[i] if keys is not None else None
+            cached = self.doc_token_cache.get((self.doc_token_cap, key)) if key is not None else None
+            if cached is None:
+                missing.append(i)
+            else:
+                tokens[i] = cached
+
+        for i, ids in zip(missing, self.tokenize([docs[i] for i in missing], self.doc_token_cap)):
+            tokens[i] = ids
+            key = keys[i] if keys is not None else None
+            if key is not None:
+                self.doc_token_cache.set((self.doc_token_cap, key), np.asarray(ids, dtype=np.int32))
+        return tokens, len(docs) - len(missing)
+
+    def warm(self, keys: List[Hashable], docs: List[str]):
+        """Pre-tokenize documents (e.g. at ingestion) so later reranks skip them."""
+        if self.doc_token_cache.enabled:
+            self.doc_tokens(docs, keys)
+
+    def score(self, pairs: List[Tuple[str, str]],
+              doc_keys: Optional[List[Hashable]] = None) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """Score raw text pairs; returns (scores in input order, stats with per-stage timings).
+
+        ``doc_keys`` (e.g. Milvus chunk ids) enable the document token cache.
+        """
+        start = time.perf_counter()
+        queries = list(dict.fromkeys(query for query, _ in pairs))
+        query_tokens = dict(zip(queries, self.tokenize(queries, self.max_length // 2)))
+        doc_tokens, cached_docs = self.doc_tokens([doc for _, doc in pairs], doc_keys)
+        tokenize_ms = (time.perf_counter() - start) * 1000
+
+        scores, stats = self.score_tokenized([query_tokens[query] for query, _ in pairs], doc_tokens)
+        stats["tokenize_ms"] = tokenize_ms
+        stats["pretokenized_docs"] = cached_docs
+        return scores, stats
@@ -2,12 +2,34 @@ import json
 import uuid
 import logging
 import re
-from typing import List, Dict, Any, Optional
-from pymilvus import connections, Collection, FieldSchema, CollectionSchema, DataType, utility
-import onnxruntime as ort
-from transformers import AutoTokenizer
+from typing import List, Dict, Any, Optional, Tuple
+from pymilvus import connections, FieldSchema, CollectionSchema, DataType
 import numpy as np
 import os
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import (
+    EMBED_CACHE_SIZE, EMBED_CACHE_TTL_S, COLLECTION_STATE_REFRESH_S,
+    RESULT_CACHE_SIZE, RESULT_CACHE_TTL_S, SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD,
+    RERANK_SCORE_CACHE_SIZE, RERANK_SCORE_CACHE_TTL_S,
+    RERANK_CASCADE_MODE, RERANK_SKIP_MARGIN, RERANK_POOL_SPREAD,
+    PRIOR_PRUNE_TOP_M, PRIOR_WEIGHT, FILE_GROUP_CAP, FILE_GROUP_OVERFETCH,
+    DEADLINE_RESERVE_MS, DEADLINE_RERANK_MS_PER_PAIR,
+    RETRIEVAL_MODE, HYBRID_RRF_K, HYBRID_DENSE_RATIO, RETRIEVAL_WORKERS,
+    SYMBOL_FAST_PATH, SYMBOL_SEED_CANDIDATES
+)
+from app.services.cache import LRUTTLCache, SemanticCache, normalize_query
+from app.services.embedding_batcher import encode_texts
+from app.services.ingestion_events import collection_generations
+from app.services.lexical_index import lexical_indexes
+from app.services.model_registry import model_registry
+from app.services.symbol_index import SYMBOL_KINDS, exact_symbol, symbol_indexes
+from app.services.vector_index import (
+    LEGACY_INDEX, as_l2_distance, describe_index, index_params, search_params
+)
+from app.services.vector_store import Collection, utility, USE_LOCAL_STORE
 
 
 
@@ -15,40 +37,108 @@ logging.basicConfig(level=logging.CRITICAL)
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.CRITICAL)
 
+# Metadata fields returned with each hit when present in the collection schema
+ENHANCED_FIELDS = [
+    "file_name", "file_path", "file_type", "source_link", "github_link", "chunk_index", 
+    "language", "has_code", "repo_name", "content_quality_score", 
+    "semantic_density_score", "information_value_score", "image_links"
+]
+
+# Per-chunk quality scores computed at ingestion, used as retrieval priors
+PRIOR_FIELDS = ["content_quality_score", "semantic_density_score", "information_value_score"]
+
+
+# BM25 lookups run here while the request thread waits on the vector search
+_lexical_pool = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="lexical")
+
+
+class FetchedHit:
+    """Chunk fetched by id (lexical or symbol index match) or a rescaled IP/COSINE
+    search hit, shaped like a Milvus search hit"""
+
+    def __init__(self, id: str, distance: float, entity: Dict[str, Any]):
+        self.id = id
+        self.distance = distance
+        self.score = distance
+        self.entity = entity
+
+
+class DeadlineExceededError(Exception):
+    """Vector search could not complete within the request's latency budget."""
+
+
+def _remaining_ms(deadline: Optional[float]) -> Optional[float]:
+    """Milliseconds left until a ``time.monotonic()`` deadline (None = unbounded)"""
+    if deadline is None:
+        return None
+    return (deadline - time.monotonic()) * 1000
+
 
 class RetrievalService:
     def __init__(self):
-        # Initialize embedding model with ONNX (offline mode)
+        # Embedding model handles are shared process-wide via the model registry
         try:
-            # Use local tokenizer files instead of downloading from HuggingFace
-            self.embedding_tokenizer = AutoTokenizer.from_pretrained(
-                "onnx/", 
-                local_files_only=True
-            )
-            self.embedding_session = ort.InferenceSession("onnx/model.onnx")
+            self.embedding_tokenizer, self.embedding_session = model_registry.embedding_model()
+            # Coalesce concurrent query encodings into one padded batch
+            self.embedding_batcher = model_registry.embedding_batcher()
+            self.embedding_fingerprint = model_registry.embedding_fingerprint()
             self.has_embedding_model = True
         except Exception as e:
             logger.warning(f"Could not load embedding model: {e}")
             self.embedding_tokenizer = None
             self.embedding_session = None
+            self.embedding_batcher = None
+            self.embedding_fingerprint = None
             self.has_embedding_model = False
+
+        # Query embedding cache; the model fingerprint is part of every key so
+        # swapping the ONNX model or tokenizer invalidates old vectors
+        self.embedding_cache = LRUTTLCache(maxsize=EMBED_CACHE_SIZE, ttl_seconds=EMBED_CACHE_TTL_S)
+        self._lowercase_queries = bool(
+            getattr(self.embedding_tokenizer, "init_kwargs", {}).get("do_lower_case", False)
+        )
         
-        # Initialize reranker model with ONNX (offline mode)
+        # Reranker (cross-encoder) handles, also shared via the registry
         try:
-            # Use local tokenizer files for cross-encoder as well
-            self.reranker_tokenizer = AutoTokenizer.from_pretrained(
-                "onnx/", 
-                local_files_only=True
-            )
-            self.reranker_session = ort.InferenceSession("onnx/cross_encoder.onnx")
+            self.reranker_tokenizer, self.reranker_session = model_registry.reranker_model()
+            self.rerank_engine = model_registry.rerank_engine()
+            self.reranker_fingerprint = model_registry.reranker_fingerprint()
             self.has_reranker = True
         except Exception as e:
             logger.warning(f"Could not load reranker model: {e}")
             self.reranker_tokenizer = None
             self.reranker_session = None
+            self.rerank_engine = None
+            self.reranker_fingerprint = None
             self.has_reranker = False
+
+        # Cross-encoder logits keyed by (reranker, normalized query, chunk id);
+        # chunk text is immutable once ingested, so a pair never needs re-scoring
+        self.score_cache = LRUTTLCache(maxsize=RERANK_SCORE_CACHE_SIZE, ttl_seconds=RERANK_SCORE_CACHE_TTL_S)
+        
+        # Full search responses, keyed on the collection generation at the time
+        # they were computed; any ingestion into the collection makes them stale
+        self.result_cache = LRUTTLCache(maxsize=RESULT_CACHE_SIZE, ttl_seconds=RESULT_CACHE_TTL_S)
+        # Second tier: reuse results of a near-duplicate (paraphrased) query
+        self.semantic_cache = SemanticCache(capacity=SEMANTIC_CACHE_SIZE, threshold=SEMANTIC_CACHE_THRESHOLD)
+        self._result_cache_generation = None
+        # Last result per query regardless of generation; only served when a
+        # deadline leaves no time for a fresh vector search
+        self.stale_cache = LRUTTLCache(maxsize=RESULT_CACHE_SIZE)
+        # Observed cross-encoder cost per candidate pair (EWMA), for deadlines
+        self._rerank_ms_per_pair = DEADLINE_RERANK_MS_PER_PAIR
         
         self.collection = None
+        self.collection_name = None
+        # Load state and resolved output fields, refreshed on ingestion/schema
+        # events or every COLLECTION_STATE_REFRESH_S instead of per request
+        self._output_fields = {True: ["document"], False: ["document"]}
+        self._prior_fields: List[str] = []
+        self._has_file_path = False
+        self._native_group_by = True
+        self._vector_index = LEGACY_INDEX
+        self._collection_state_checked_at = 0.0
+        self._collection_state_stale = True
         
     def connect_to_milvus(self, force: bool = False):
         """Establish a Milvus connection using env vars with retries.
@@ -60,6 +150,9 @@ class RetrievalService:
         Raises:
             RuntimeError if connection cannot be established.
         """
+        if USE_LOCAL_STORE:
+            # Embedded vector store (VECTOR_STORE=local): nothing to connect to
+            return
         if not force:
             # If already connected, avoid reconnect unless forced
             try:
@@ -121,38 +214,73 @@ class RetrievalService:
         raise RuntimeError(f"Failed to connect to Milvus after retries: {last_error}")
         
     def _encode_text(self, text: str) -> List[float]:
-        """Encode text using ONNX embedding model"""
+        """Encode text using ONNX embedding model (micro-batched across concurrent callers)"""
         if not self.has_embedding_model:
             raise ValueError("Embedding model not loaded")
             
-        inputs = self.embedding_tokenizer(
-            text, 
-            return_tensors="np", 
-            padding=True, 
-            truncation=True, 
-            max_length=512
-        )
-        
-        onnx_inputs = {
-            "input_ids": inputs["input_ids"].astype(np.int64),
-            "attention_mask": inputs["attention_mask"].astype(np.int64)
+        return self.embedding_batcher.encode(text)
+
+    def _encode_query(self, query: str) -> np.ndarray:
+        """Return the float32 query embedding, served from the embedding cache when possible"""
+        return self._encode_queries([query])[0]
+
+    def normalize(self, query: str) -> str:
+        """``query`` as the result and embedding caches key it"""
+        return normalize_query(query, self._lowercase_queries)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "embedding_cache": self.embedding_cache.stats(),
+            "result_cache": self.result_cache.stats(),
+            "semantic_cache": self.semantic_cache.stats(),
+            "rerank_score_cache": self.score_cache.stats(),
         }
+
+    def _current_generation(self):
+        """Return the collection generation, dropping cached results computed under an older one"""
+        generation = collection_generations.current(self.collection_name)
+        if generation != self._result_cache_generation:
+            self.result_cache.clear()
+            self.semantic_cache.clear()
+            if self._result_cache_generation is not None:
+                # Ingestion may have recreated the collection or changed its schema
+                self._collection_state_stale = True
+            self._result_cache_generation = generation
+        return generation
+
+    def _refresh_collection_state(self):
+        """Re-describe and load the collection and resolve the output fields once"""
+        self.collection = Collection(self.collection_name)
+        self.collection.load()
+        collection_fields = {field.name for field in self.collection.schema.fields}
+        self._output_fields = {
+            True: ["document"] + [field for field in ENHANCED_FIELDS if field in collection_fields],
+            False: ["document"],
+        }
+        self._prior_fields = [field for field in PRIOR_FIELDS if field in collection_fields]
+        self._has_file_path = "file_path" in collection_fields
+        self._native_group_by = True
+        try:
+            self._vector_index = describe_index(self.collection) or LEGACY_INDEX
+        except Exception as e:
+            logger.warning(f"Could not describe the vector index, assuming {LEGACY_INDEX}: {e}")
+            self._vector_index = LEGACY_INDEX
+        self._collection_state_checked_at = time.monotonic()
+        self._collection_state_stale = False
+
+    def _ensure_collection_ready(self):
+        age = time.monotonic() - self._collection_state_checked_at
+        if self._collection_state_stale or age > COLLECTION_STATE_REFRESH_S:
+            self._refresh_collection_state()
         
-        if "token_type_ids" in inputs:
-            onnx_inputs["token_type_ids"] = inputs["token_type_ids"].astype(np.int64)
-        
-        # Get outputs from the ONNX model
-        outputs = self.embedding_session.run(None, onnx_inputs)
-        
-        # Use mean pooling over token embeddings
-        embedding = outputs[0][0].mean(axis=0)
-        
-        # Normalize the embedding
-        norm = np.linalg.norm(embedding)
-        normalized_embedding = (embedding / norm) if norm != 0 else embedding
-        
-        return normalized_embedding.tolist()
-        
+    def open_collection(self, collection_name: str):
+        """Use an existing collection as is (no creation, schema check or index change)"""
+        self.connect_to_milvus()
+        if not utility.has_collection(collection_name):
+            raise ValueError(f"Collection '{collection_name}' does not exist")
+        self.collection_name = collection_name
+        self._refresh_collection_state()
+
     def create_collection(self, collection_name: str):
         # Ensure connection first
         try:
@@ -166,8 +294,7 @@ class RetrievalService:
             embedding_dim = 768
         else:
             try:
-                sample_embedding = self._encode_text("test")
-                embedding_dim = len(sample_embedding)
+                embedding_dim = model_registry.embedding_dim()
             except Exception as e:
                 logger.warning(f"Error getting embedding dimension: {e}")
                 # Fallback to common dimensions
@@ -206,100 +333,637 @@ class RetrievalService:
                 logger.info(f"Dimension mismatch: existing collection has {existing_dim}, but model produces {embedding_dim}")
                 logger.info("Dropping and recreating collection...")
                 utility.drop_collection(collection_name)
+                lexical_indexes.drop(collection_name)
+                symbol_indexes.drop(collection_name)
                 self.collection = Collection(collection_name, schema)
                 
-                index_params = {
-                    "metric_type": "L2",
-                    "index_type": "IVF_FLAT",
-                    "params": {"nlist": 1024}
-                }
-                self.collection.create_index("embedding", index_params)
+                self.collection.create_index("embedding", index_params(0))
             else:
                 self.collection = existing_collection
         else:
             self.collection = Collection(collection_name, schema)
             
-            index_params = {
-                "metric_type": "L2",
-                "index_type": "IVF_FLAT",
-                "params": {"nlist": 1024}
-            }
-            self.collection.create_index("embedding", index_params)
+            self.collection.create_index("embedding", index_params(0))
         
-        self.collection.load()
+        self.collection_name = collection_name
+        self._refresh_collection_state()
         
-    def search(self, query: str, n_results: int = 10, include_metadata: bool = True, rerank: bool = True) -> Dict[str, Any]:
+    def search(self, query: str, n_results: int = 10, include_metadata: bool = True, rerank: bool = True,
+               rerank_mode: Optional[str] = None, max_chunks_per_file: Optional[int] = None,
+               retrieval_mode: Optional[str] = None, deadline: Optional[float] = None,
+               nprobe: Optional[int] = None, ef: Optional[int] = None) -> Dict[str, Any]:
+        return self.search_batch(
+            [query], n_results, include_metadata, rerank, rerank_mode, max_chunks_per_file,
+            retrieval_mode, deadline, nprobe, ef
+        )[0]
+
+    def search_batch(self, queries: List[str], n_results: int = 10, include_metadata: bool = True,
+                     rerank: bool = True, rerank_mode: Optional[str] = None,
+                     max_chunks_per_file: Optional[int] = None, retrieval_mode: Optional[str] = None,
+                     deadline: Optional[float] = None, nprobe: Optional[int] = None,
+                     ef: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Search several queries at once: one padded embedding batch, one
+        multi-vector Milvus search and one cross-encoder batch for the misses.
+
+        ``retrieval_mode`` "hybrid" also ranks chunks with the BM25 index and
+        fuses both rankings (reciprocal-rank fusion) before reranking.
+
+        ``nprobe`` (IVF indexes) and ``ef`` (HNSW) override the search breadth
+        derived from the collection's index; the other knob is ignored.
+
+        ``deadline`` is a ``time.monotonic()`` timestamp; stages that would
+        overrun it are shortened or skipped and reported in search_info.degraded.
+        """
         if self.collection is None:
             raise ValueError("Collection not created.")
-            
-        self.collection.load()
-        
+
+        rerank_mode = rerank_mode or RERANK_CASCADE_MODE
+        if rerank_mode not in ("full", "adaptive"):
+            raise ValueError(f"Unknown rerank mode: {rerank_mode}")
+
+        retrieval_mode = retrieval_mode or RETRIEVAL_MODE
+        if retrieval_mode not in ("dense", "hybrid"):
+            raise ValueError(f"Unknown retrieval mode: {retrieval_mode}")
+
+        if max_chunks_per_file is None:
+            max_chunks_per_file = FILE_GROUP_CAP
+
+        for name, value in (("nprobe", nprobe), ("ef", ef)):
+            if value is not None and value < 1:
+                raise ValueError(f"{name} must be a positive integer")
+
+        generation = self._current_generation()
+        params = (n_results, include_metadata, rerank, rerank_mode, max_chunks_per_file, retrieval_mode,
+                  nprobe, ef)
+        normalized_queries = [self.normalize(query) for query in queries]
+        cache_keys = [(self.collection_name, generation, nq) + params for nq in normalized_queries]
+        stale_keys = [(self.collection_name, nq) + params for nq in normalized_queries]
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+        pending = []
+        for i, cache_key in enumerate(cache_keys):
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                results[i] = self._with_search_info(cached, cache="exact")
+            else:
+                pending.append(i)
+        if not pending:
+            return results
+
+        remaining = _remaining_ms(deadline)
+        if remaining is not None and remaining <= DEADLINE_RESERVE_MS:
+            # The budget was spent waiting for a worker
+            for i in pending:
+                results[i] = self._deadline_fallback(stale_keys[i], ["embed", "vector_search"])
+            return results
+
         # Use ONNX embedding model
         if not self.has_embedding_model:
             raise ValueError("Embedding model not loaded")
             
-        embedding = self._encode_text(query)
-        
-        # Convert to numpy array with correct shape (1, embedding_dim)
-        query_embedding = np.array([embedding], dtype=np.float32)
-        
-        # Verify the shape is correct
-        if query_embedding.ndim != 2:
-            query_embedding = query_embedding.reshape(1, -1)
-        search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
-        
-        output_fields = ["document"]
-        enhanced_fields = [
-            "file_name", "file_path", "file_type", "source_link", "github_link", "chunk_index", 
-            "language", "has_code", "repo_name", "content_quality_score", 
-            "semantic_density_score", "information_value_score", "image_links"
+        embed_start = time.perf_counter()
+        embeddings = self._encode_queries([queries[i] for i in pending])
+        embed_ms = (time.perf_counter() - embed_start) * 1000
+
+        if SYMBOL_FAST_PATH and not rerank:
+            answered = self._symbol_fast_path(
+                queries, dict(zip(pending, embeddings)), n_results, include_metadata, max_chunks_per_file,
+                deadline
+            )
+            for i, fresh in answered.items():
+                fresh["search_info"]["timings_ms"]["embed"] = embed_ms
+                self.result_cache.set(cache_keys[i], fresh)
+                self.stale_cache.set(stale_keys[i], fresh)
+                results[i] = fresh
+            embeddings = [embedding for i, embedding in zip(pending, embeddings) if i not in answered]
+            pending = [i for i in pending if i not in answered]
+            if not pending:
+                return results
+
+        to_search = []
+        for i, embedding in zip(pending, embeddings):
+            semantic_hit = self.semantic_cache.lookup(embedding, params, generation)
+            if semantic_hit is not None:
+                cached, similarity, matched_query = semantic_hit
+                results[i] = self._with_search_info(
+                    cached, cache="semantic", similarity=similarity, matched_query=matched_query
+                )
+            else:
+                to_search.append((i, embedding))
+        if not to_search:
+            return results
+
+        try:
+            fresh_results = self._search_many(
+                [queries[i] for i, _ in to_search],
+                np.stack([embedding for _, embedding in to_search]),
+                n_results, include_metadata, rerank, rerank_mode, max_chunks_per_file,
+                retrieval_mode, deadline, nprobe, ef
+            )
+        except DeadlineExceededError as e:
+            logger.warning(f"Vector search missed the deadline: {e}")
+            for i, _ in to_search:
+                results[i] = self._deadline_fallback(stale_keys[i], ["vector_search"])
+            return results
+
+        for (i, embedding), fresh in zip(to_search, fresh_results):
+            fresh["search_info"]["cache"] = "miss"
+            fresh["search_info"]["timings_ms"]["embed"] = embed_ms
+            if not fresh["search_info"].get("degraded"):
+                self.result_cache.set(cache_keys[i], fresh)
+                self.semantic_cache.add(embedding, params, normalized_queries[i], fresh, generation)
+                self.stale_cache.set(stale_keys[i], fresh)
+            results[i] = fresh
+        return results
+
+    def _deadline_fallback(self, stale_key: Tuple, degraded: List[str]) -> Dict[str, Any]:
+        """Best answer available without a vector search: the last result for
+        the same query and parameters, else an empty partial result"""
+        cached = self.stale_cache.get(stale_key)
+        if cached is not None:
+            return self._with_search_info(cached, cache="stale", degraded=degraded)
+        result = self._format_results([], 0, [])
+        result["search_info"] = {"cache": "miss", "degraded": degraded, "partial": True}
+        return result
+
+    def _symbol_fast_path(self, queries: List[str], embeddings: Dict[int, np.ndarray], n_results: int,
+                          include_metadata: bool, max_chunks_per_file: int,
+                          deadline: Optional[float] = None) -> Dict[int, Dict[str, Any]]:
+        """Answer identifier queries naming a defined function or class straight
+        from the symbol index, without vector search. Definitions come first,
+        then other matches, each by exact vector distance to the query embedding
+        (``embeddings``, by query position), so distances and scores are real.
+
+        Returns {query position: result} for the queries it answered.
+        """
+        symbols = {i: exact_symbol(queries[i]) for i in embeddings}
+        symbols = {i: symbol for i, symbol in symbols.items() if symbol}
+        if not symbols:
+            return {}
+        symbol_index = symbol_indexes.get(self.collection_name)
+        if symbol_index is None:
+            return {}
+        matches = {}
+        for i, symbol in symbols.items():
+            entries = symbol_index.lookup(symbol)
+            if entries and entries[0][1] == "definition":
+                matches[i] = (symbol, entries)
+        if not matches:
+            return {}
+
+        start = time.perf_counter()
+        self._ensure_collection_ready()
+        output_fields = self._output_fields[bool(include_metadata)]
+        fetch_fields = output_fields
+        if max_chunks_per_file > 0 and self._has_file_path and "file_path" not in output_fields:
+            fetch_fields = output_fields + ["file_path"]
+        chunk_ids = sorted({chunk_id for _, entries in matches.values() for chunk_id, _ in entries})
+        try:
+            rows, vectors = self._fetch_chunks(chunk_ids, fetch_fields, deadline, with_vectors=True)
+        except Exception as e:
+            logger.warning(f"Symbol lookup failed, using vector search: {e}")
+            return {}
+        lookup_ms = (time.perf_counter() - start) * 1000
+
+        answered = {}
+        for i, (symbol, entries) in matches.items():
+            ranked = []
+            for chunk_id, kind in entries:
+                if chunk_id in rows:
+                    # Squared L2, as Milvus reports it for dense hits
+                    distance = float(np.sum((vectors[chunk_id] - embeddings[i]) ** 2))
+                    ranked.append((SYMBOL_KINDS.index(kind), distance, chunk_id))
+            if not ranked:
+                continue
+            hits = [FetchedHit(chunk_id, distance, rows[chunk_id]) for _, distance, chunk_id in sorted(ranked)]
+            if max_chunks_per_file > 0:
+                hits = self._cap_per_file(hits, max_chunks_per_file, len(hits))
+            result = self._format_results(hits[:n_results], len(hits), output_fields)
+            result["search_info"] = {
+                "cache": "miss",
+                "retrieval_mode": "symbol",
+                "symbol": {"name": symbol, "matches": len(entries)},
+                "rerank_path": "none",
+                "timings_ms": {"symbol_lookup": lookup_ms},
+            }
+            answered[i] = result
+        return answered
+
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed several queries, encoding all cache misses in one padded batch"""
+        embeddings: List[Optional[np.ndarray]] = [None] * len(queries)
+        misses = []
+        for i, query in enumerate(queries):
+            key = (self.embedding_fingerprint, normalize_query(query, self._lowercase_queries))
+            embeddings[i] = self.embedding_cache.get(key)
+            if embeddings[i] is None:
+                misses.append(i)
+
+        if len(misses) == 1:
+            # A lone query goes through the micro-batcher to share a pass with other requests
+            encoded = [np.asarray(self._encode_text(queries[misses[0]]), dtype=np.float32)]
+        elif misses:
+            encoded = encode_texts(
+                self.embedding_tokenizer, self.embedding_session, [queries[i] for i in misses]
+            )
+        else:
+            encoded = []
+        for i, embedding in zip(misses, encoded):
+            embedding.setflags(write=False)
+            key = (self.embedding_fingerprint, normalize_query(queries[i], self._lowercase_queries))
+            self.embedding_cache.set(key, embedding)
+            embeddings[i] = embedding
+        return np.stack(embeddings)
+
+    @staticmethod
+    def _with_search_info(results: Dict[str, Any], **info) -> Dict[str, Any]:
+        """Shallow copy of a cached result with updated search_info"""
+        return {**results, "search_info": {**results.get("search_info", {}), **info}}
+
+    def _search_params(self, limit: int, nprobe: Optional[int] = None, ef: Optional[int] = None) -> Dict[str, Any]:
+        return search_params(self._vector_index, limit, nprobe, ef)
+
+    def _as_l2_hits(self, results) -> List[List[Any]]:
+        """Search results with IP/COSINE similarities turned into squared L2
+        distances, so every metric ranks and scores like the L2 index"""
+        metric = self._vector_index["metric_type"]
+        if metric == "L2":
+            return results
+        return [
+            [FetchedHit(hit.id, as_l2_distance(metric, hit.distance), hit.entity) for hit in hits]
+            for hits in results
         ]
-        
-        if include_metadata:
-            try:
-                collection_fields = [field.name for field in self.collection.schema.fields]
-                output_fields.extend([field for field in enhanced_fields if field in collection_fields])
-            except:
-                pass
-        
-        search_limit = n_results * 3 if rerank else n_results
+
+    @staticmethod
+    def _rpc_timeout(deadline: Optional[float]) -> Optional[float]:
+        """Milvus RPC timeout in seconds for what is left of the budget"""
+        remaining = _remaining_ms(deadline)
+        if remaining is None:
+            return None
+        remaining -= DEADLINE_RESERVE_MS
+        if remaining <= 0:
+            raise DeadlineExceededError("no time left for vector search")
+        return remaining / 1000
+
+    def _vector_search(self, query_embeddings: np.ndarray, limit: int, output_fields: List[str],
+                       deadline: Optional[float] = None, nprobe: Optional[int] = None,
+                       ef: Optional[int] = None):
+        """One Milvus search RPC for all query vectors (rows of a 2-D array)"""
+        search_params = self._search_params(limit, nprobe, ef)
         
         try:
-            results = self.collection.search(
-                query_embedding, 
+            return self._as_l2_hits(self.collection.search(
+                query_embeddings, 
                 "embedding", 
                 search_params, 
-                limit=search_limit,
+                limit=limit,
                 output_fields=output_fields,
-                expr=None
-            )
+                expr=None,
+                timeout=self._rpc_timeout(deadline)
+            ))
+        except DeadlineExceededError:
+            raise
         except Exception as e:
+            if deadline is not None and _remaining_ms(deadline) <= DEADLINE_RESERVE_MS:
+                raise DeadlineExceededError(str(e)) from e
             logger.warning(f"Search with enhanced fields failed: {e}")
+            # The collection may have been released or recreated since the last check
+            self._collection_state_stale = True
+            try:
+                self._refresh_collection_state()
+            except Exception as refresh_error:
+                logger.warning(f"Collection state refresh failed: {refresh_error}")
             basic_fields = ["document"]
-            results = self.collection.search(
-                query_embedding, 
+            return self._as_l2_hits(self.collection.search(
+                query_embeddings, 
                 "embedding", 
-                search_params, 
-                limit=search_limit,
+                self._search_params(limit, nprobe, ef), 
+                limit=limit,
                 output_fields=basic_fields,
-            )
+                timeout=self._rpc_timeout(deadline)
+            ))
+
+    def _grouped_vector_search(self, query_embeddings: np.ndarray, limit: int, output_fields: List[str],
+                               per_file: int, deadline: Optional[float] = None, nprobe: Optional[int] = None,
+                               ef: Optional[int] = None) -> Tuple[List[List[Any]], str]:
+        """Up to ``limit`` hits per query with at most ``per_file`` chunks from any one
+        file_path, closest first. Returns (hits per query, grouping method)."""
+        if self._native_group_by:
+            try:
+                results = self._as_l2_hits(self.collection.search(
+                    query_embeddings,
+                    "embedding",
+                    self._search_params(limit * per_file, nprobe, ef),
+                    limit=limit,
+                    output_fields=output_fields,
+                    group_by_field="file_path",
+                    group_size=per_file,
+                    strict_group_size=False,
+                    timeout=self._rpc_timeout(deadline)
+                ))
+                # Group-by returns hits grouped per file; restore distance order and
+                # enforce the cap in case the server returned larger groups
+                return [
+                    self._cap_per_file(sorted(hits, key=lambda hit: hit.distance), per_file, limit)
+                    for hits in results
+                ], "native"
+            except DeadlineExceededError:
+                raise
+            except Exception as e:
+                if deadline is not None and _remaining_ms(deadline) <= DEADLINE_RESERVE_MS:
+                    raise DeadlineExceededError(str(e)) from e
+                logger.warning(f"Group-by search unavailable, falling back to post-filter: {e}")
+                self._native_group_by = False
+
+        results = self._vector_search(
+            query_embeddings, limit * max(1, FILE_GROUP_OVERFETCH), output_fields, deadline, nprobe, ef
+        )
+        return [self._cap_per_file(list(hits), per_file, limit) for hits in results], "post_filter"
+
+    @staticmethod
+    def _cap_per_file(hits: List[Any], per_file: int, limit: int) -> List[Any]:
+        """Keep hits in order, skipping those beyond ``per_file`` for their file_path"""
+        counts: Dict[str, int] = {}
+        kept = []
+        for hit in hits:
+            file_path = hit.entity.get("file_path")
+            if file_path is not None:
+                if counts.get(file_path, 0) >= per_file:
+                    continue
+                counts[file_path] = counts.get(file_path, 0) + 1
+            kept.append(hit)
+            if len(kept) >= limit:
+                break
+        return kept
+
+    def _search_many(self, queries: List[str], embeddings: np.ndarray, n_results: int,
+                     include_metadata: bool, rerank: bool, rerank_mode: str = "full",
+                     max_chunks_per_file: int = 0, retrieval_mode: str = "dense",
+                     deadline: Optional[float] = None, nprobe: Optional[int] = None,
+                     ef: Optional[int] = None) -> List[Dict[str, Any]]:
+        self._ensure_collection_ready()
         
-        if not results or len(results[0]) == 0:
-            return {
-                "documents": [[]],
-                "metadatas": [[]],
-                "distances": [[]],
-                "total_found": 0,
-                "filtered_results": 0
-            }
+        # Milvus accepts a 2-D (num_queries, embedding_dim) array
+        query_embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(queries), -1)
         
-        hits = results[0]
+        output_fields = self._output_fields[bool(include_metadata)]
         
-        if rerank and len(hits) > n_results:
-            hits = self._rerank_results(hits, query, n_results)
+        search_limit = n_results * 3 if rerank else n_results
+        prune = rerank and PRIOR_PRUNE_TOP_M > 0 and bool(self._prior_fields)
+        search_fields = output_fields
+        if prune:
+            search_fields = output_fields + [field for field in self._prior_fields if field not in output_fields]
+        group_by_file = max_chunks_per_file > 0 and self._has_file_path
+        if group_by_file and "file_path" not in search_fields:
+            search_fields = search_fields + ["file_path"]
+        
+        # Hybrid: BM25 runs on a worker thread while Milvus serves the (smaller) dense pool
+        lexical_future = None
+        dense_limit = search_limit
+        if retrieval_mode == "hybrid":
+            lexical_index = lexical_indexes.get(self.collection_name)
+            if lexical_index is not None and len(lexical_index):
+                lexical_future = _lexical_pool.submit(
+                    lambda: [lexical_index.search(query, search_limit) for query in queries]
+                )
+                dense_limit = max(n_results, math.ceil(search_limit * HYBRID_DENSE_RATIO))
+        
+        # Chunks defining or importing identifiers the query names
+        seeds: List[List[str]] = []
+        if SYMBOL_SEED_CANDIDATES > 0:
+            symbol_index = symbol_indexes.get(self.collection_name)
+            if symbol_index is not None:
+                seeds = [symbol_index.seed(query, SYMBOL_SEED_CANDIDATES) for query in queries]
+        
+        grouping = None
+        search_start = time.perf_counter()
+        if group_by_file:
+            results, grouping = self._grouped_vector_search(
+                query_embeddings, dense_limit, search_fields, max_chunks_per_file, deadline, nprobe, ef
+            )
         else:
-            hits = hits[:n_results]
+            results = self._vector_search(query_embeddings, dense_limit, search_fields, deadline, nprobe, ef)
+        search_ms = (time.perf_counter() - search_start) * 1000
+        candidates = [
+            list(results[i]) if results and i < len(results) else []
+            for i in range(len(queries))
+        ]
+        rankings: Dict[str, List[List[str]]] = {}
+        if lexical_future is not None:
+            rankings["lexical"] = [[chunk_id for chunk_id, _ in hits] for hits in lexical_future.result()]
+        if any(seeds):
+            rankings["symbols"] = seeds
+        fused = bool(rankings)
+        fusion_info: List[Dict[str, Any]] = [{} for _ in candidates]
+        if fused:
+            fusion_start = time.perf_counter()
+            candidates, fusion_info = self._fuse_rankings(
+                query_embeddings, candidates, rankings, search_limit, search_fields, deadline
+            )
+            if lexical_future is None:
+                # Symbol seeds only widen the pool: keep distance order so adaptive reranking still applies
+                candidates = [sorted(hits, key=lambda hit: hit.distance) for hits in candidates]
+            if group_by_file:
+                candidates = [self._cap_per_file(hits, max_chunks_per_file, search_limit) for hits in candidates]
+            fusion_ms = (time.perf_counter() - fusion_start) * 1000
+        total_found = [len(hits) for hits in candidates]
+        pruned = [0] * len(candidates)
+        if prune:
+            for i, hits in enumerate(candidates):
+                candidates[i] = self._prune_by_priors(hits, max(PRIOR_PRUNE_TOP_M, n_results))
+                pruned[i] = len(hits) - len(candidates[i])
         
+        selected = [hits[:n_results] for hits in candidates]
+        rerank_info: Dict[str, Any] = {}
+        paths = ["none"] * len(candidates)
+        pools = [0] * len(candidates)
+        if rerank and self.has_reranker:
+            # Lists fused with BM25 are not in distance order, so the adaptive cascade does not apply
+            plan_mode = "full" if lexical_future is not None else rerank_mode
+            for i, hits in enumerate(candidates):
+                paths[i], pools[i] = self._rerank_plan(hits, n_results, plan_mode)
+        degraded = self._fit_rerank_to_deadline(paths, pools, n_results, deadline)
+        to_rerank = [i for i, path in enumerate(paths) if path in ("full", "reduced")]
+        if to_rerank:
+            reranked, rerank_info = self._rerank_many(
+                [queries[i] for i in to_rerank],
+                [candidates[i][:pools[i]] for i in to_rerank],
+                n_results
+            )
+            for i, hits in zip(to_rerank, reranked):
+                selected[i] = hits
+            pairs = sum(pools[i] for i in to_rerank)
+            if pairs and "total_ms" in rerank_info:
+                self._rerank_ms_per_pair = 0.8 * self._rerank_ms_per_pair + 0.2 * rerank_info["total_ms"] / pairs
+        
+        vector_index = {
+            "type": self._vector_index["index_type"],
+            "metric": self._vector_index["metric_type"],
+            **self._search_params(dense_limit, nprobe, ef)["params"],
+        }
+        formatted = []
+        for found, hits, path, pool, dropped, cut, fusion in zip(
+            total_found, selected, paths, pools, pruned, degraded, fusion_info
+        ):
+            result = self._format_results(hits, found, output_fields)
+            result["search_info"] = {
+                "timings_ms": {
+                    "vector_search": search_ms,
+                    **({"fusion": fusion_ms} if fused else {}),
+                    "rerank": rerank_info.get("total_ms", 0.0) if path in ("full", "reduced") else 0.0
+                },
+                "retrieval_mode": ("hybrid" if lexical_future is not None else "dense")
+                                  + ("+symbols" if fusion.get("symbols", {}).get("added") else ""),
+                "index": vector_index,
+                **fusion,
+                "rerank_path": path,
+                **({"rerank_candidates": pool} if path == "reduced" else {}),
+                **({"prior_pruned": dropped} if prune else {}),
+                **({"grouping": grouping} if grouping else {}),
+                **({"degraded": ["rerank"]} if cut else {}),
+                **({"rerank": rerank_info} if rerank_info and path in ("full", "reduced") else {}),
+            }
+            formatted.append(result)
+        return formatted
+
+    def _fetch_chunks(self, chunk_ids: List[str], output_fields: List[str], deadline: Optional[float] = None,
+                      with_vectors: bool = False) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, np.ndarray]]:
+        """Rows (and optionally embeddings) for chunk ids, in one Milvus query.
+
+        Returns ({id: row}, {id: embedding}); ids that no longer exist are absent.
+        """
+        rows: Dict[str, Dict[str, Any]] = {}
+        vectors: Dict[str, np.ndarray] = {}
+        if not chunk_ids:
+            return rows, vectors
+        fields = ["id"] + (["embedding"] if with_vectors else []) + output_fields
+        fetched = self.collection.query(
+            expr=f"id in [{', '.join(json.dumps(chunk_id) for chunk_id in chunk_ids)}]",
+            output_fields=list(dict.fromkeys(fields)),
+            timeout=self._rpc_timeout(deadline)
+        )
+        for row in fetched:
+            row = dict(row)
+            if with_vectors:
+                vectors[row["id"]] = np.asarray(row.pop("embedding"), dtype=np.float32)
+            rows[row["id"]] = row
+        return rows, vectors
+
+    def _fuse_rankings(self, query_embeddings: np.ndarray, dense_hits: List[List[Any]],
+                       rankings: Dict[str, List[List[str]]], limit: int, output_fields: List[str],
+                       deadline: Optional[float] = None) -> Tuple[List[List[Any]], List[Dict[str, Any]]]:
+        """Merge the dense ranking with other rankings of chunk ids (BM25, symbol
+        seeds) per query using reciprocal-rank fusion.
+
+        Chunks the vector search did not return are fetched from Milvus by id
+        (one query for all of them) and given their exact vector distance, so
+        pruning, reranking and formatting treat them like any other hit.
+        Returns (fused hits per query, per-query {source: {candidates, added}}).
+        """
+        missing = set()
+        for q, hits in enumerate(dense_hits):
+            dense_ids = {hit.id for hit in hits}
+            for ranking in rankings.values():
+                missing.update(chunk_id for chunk_id in ranking[q] if chunk_id not in dense_ids)
+
+        rows: Dict[str, Dict[str, Any]] = {}
+        vectors: Dict[str, np.ndarray] = {}
+        try:
+            rows, vectors = self._fetch_chunks(sorted(missing), output_fields, deadline, with_vectors=True)
+        except DeadlineExceededError:
+            logger.warning("No time left to fetch fused candidates")
+        except Exception as e:
+            logger.warning(f"Fetching fused candidates failed: {e}")
+
+        fused_lists = []
+        stats = []
+        for q, hits in enumerate(dense_hits):
+            by_id: Dict[str, Any] = {}
+            fused_scores: Dict[str, float] = {}
+            for rank, hit in enumerate(hits):
+                by_id[hit.id] = hit
+                fused_scores[hit.id] = 1.0 / (HYBRID_RRF_K + rank + 1)
+            info = {}
+            for source, ranking in rankings.items():
+                added = 0
+                for rank, chunk_id in enumerate(ranking[q]):
+                    if chunk_id not in by_id:
+                        if chunk_id not in rows:
+                            continue
+                        # Squared L2, as Milvus reports it for the dense hits
+                        distance = float(np.sum((vectors[chunk_id] - query_embeddings[q]) ** 2))
+                        by_id[chunk_id] = FetchedHit(chunk_id, distance, rows[chunk_id])
+                        added += 1
+                    fused_scores[chunk_id] = fused_scores.get(chunk_id, 0.0) + 1.0 / (HYBRID_RRF_K + rank + 1)
+                info[source] = {"candidates": len(ranking[q]), "added": added}
+            order = sorted(fused_scores, key=fused_scores.get, reverse=True)[:limit]
+            fused_lists.append([by_id[key] for key in order])
+            stats.append(info)
+        return fused_lists, stats
+
+    def _prune_by_priors(self, hits: List[Any], top_m: int) -> List[Any]:
+        """Keep the ``top_m`` hits by blended vector similarity and stored quality
+        priors, in their original (distance) order."""
+        if len(hits) <= top_m:
+            return hits
+        distances = np.fromiter((hit.distance for hit in hits), dtype=np.float32, count=len(hits))
+        priors = np.array(
+            [[hit.entity.get(field) for field in self._prior_fields] for hit in hits],
+            dtype=np.float32
+        )
+        # Chunks missing a score (e.g. older ingestions) get a neutral prior
+        prior = np.where(np.isnan(priors), 0.5, priors).mean(axis=1)
+        # Squared L2 between unit vectors is 2 - 2*cos
+        similarity = 1.0 - distances / 2.0
+        blended = (1.0 - PRIOR_WEIGHT) * similarity + PRIOR_WEIGHT * prior
+        keep = np.sort(np.argpartition(-blended, top_m - 1)[:top_m])
+        return [hits[i] for i in keep]
+
+    def _fit_rerank_to_deadline(self, paths: List[str], pools: List[int], n_results: int,
+                                deadline: Optional[float]) -> List[bool]:
+        """Shrink rerank pools in place to what the remaining budget can score.
+
+        Returns, per query, whether its rerank was cut short by the deadline.
+        """
+        degraded = [False] * len(paths)
+        remaining = _remaining_ms(deadline)
+        active = [i for i, path in enumerate(paths) if path in ("full", "reduced")]
+        if remaining is None or not active:
+            return degraded
+        affordable = max(0.0, remaining - DEADLINE_RESERVE_MS) / max(self._rerank_ms_per_pair, 1e-3)
+        per_query = int(affordable // len(active))
+        for i in active:
+            if pools[i] <= per_query:
+                continue
+            degraded[i] = True
+            if per_query >= n_results:
+                paths[i], pools[i] = "reduced", per_query
+            else:
+                paths[i], pools[i] = "skipped", 0
+        return degraded
+
+    @staticmethod
+    def _rerank_plan(hits: List[Any], n_results: int, mode: str) -> Tuple[str, int]:
+        """Choose how much of the candidate list the cross-encoder sees.
+
+        Returns ("full" | "reduced" | "skipped", number of candidates to rerank).
+        Milvus returns L2 hits closest first.
+        """
+        if len(hits) <= n_results:
+            return "skipped", 0
+        if mode != "adaptive":
+            return "full", len(hits)
+
+        distances = np.fromiter((hit.distance for hit in hits), dtype=np.float32, count=len(hits))
+        if distances[1] - distances[0] >= RERANK_SKIP_MARGIN:
+            # Clear winner: keep the vector order
+            return "skipped", 0
+        pool = int(np.searchsorted(distances, distances[0] + RERANK_POOL_SPREAD, side="right"))
+        if pool >= len(hits):
+            return "full", len(hits)
+        return "reduced", max(pool, n_results)
+
+    def _format_results(self, hits: List[Any], total_found: int, output_fields: List[str]) -> Dict[str, Any]:
         documents = []
         metadatas = []
         distances = []
@@ -309,6 +973,7 @@ class RetrievalService:
             documents.append(doc_text)
             
             metadata = {
+                "id": hit.id,
                 "score": float(hit.score) if hasattr(hit, 'score') else (1 - hit.distance),
                 "distance": float(hit.distance)
             }
@@ -326,52 +991,76 @@ class RetrievalService:
             "documents": [documents],
             "metadatas": [metadatas], 
             "distances": [distances],
-            "total_found": len(results[0]),
+            "total_found": total_found,
             "filtered_results": len(hits)
         }
     
     def _rerank_results(self, hits: List[Any], query: str, n_results: int) -> List[Any]:
-        documents = [hit.entity.get("document", "") for hit in hits]
+        return self._rerank_many([query], [hits], n_results)[0][0]
+
+    def _rerank_many(self, queries: List[str], hits_lists: List[List[Any]],
+                     n_results: int) -> Tuple[List[List[Any]], Dict[str, Any]]:
+        """Rerank the candidates of several queries in one length-bucketed pass.
+
+        Returns the top ``n_results`` hits per query and rerank stats (pair and
+        token counts, micro-batches, per-stage timings).
+        """
+        start = time.perf_counter()
         rerank_scores = None
+        stats: Dict[str, Any] = {}
         
         if self.has_reranker:
             try:
-                # Prepare sentence pairs for reranking
-                sentence_pairs = [(query, doc) for doc in documents]
-                
-                # Tokenize inputs
-                inputs = self.reranker_tokenizer(
-                    sentence_pairs,
-                    padding=True,
-                    truncation=True,
-                    return_tensors='np',
-                    max_length=512
-                )
-                
-                # Run ONNX inference
-                outputs = self.reranker_session.run(
-                    None,
-                    {
-                        'input_ids': inputs['input_ids'].astype(np.int64),
-                        'attention_mask': inputs['attention_mask'].astype(np.int64),
-                        'token_type_ids': inputs['token_type_ids'].astype(np.int64)
-                    }
-                )
-                
-                rerank_scores = outputs[0].flatten()
+                # Prepare sentence pairs for reranking across all queries
+                sentence_pairs = []
+                score_keys = []
+                for query, hits in zip(queries, hits_lists):
+                    normalized_query = normalize_query(query, self._lowercase_queries)
+                    for hit in hits:
+                        sentence_pairs.append((query, hit.entity.get("document", "")))
+                        score_keys.append((self.reranker_fingerprint, normalized_query, getattr(hit, "id", None)))
+
+                # Only run the cross-encoder on pairs that have not been scored before
+                rerank_scores = np.zeros(len(sentence_pairs), dtype=np.float32)
+                missing = []
+                for j, key in enumerate(score_keys):
+                    cached_score = self.score_cache.get(key) if key[2] is not None else None
+                    if cached_score is None:
+                        missing.append(j)
+                    else:
+                        rerank_scores[j] = cached_score
+
+                if missing:
+                    fresh_scores, stats = self.rerank_engine.score(
+                        [sentence_pairs[j] for j in missing],
+                        doc_keys=[score_keys[j][2] for j in missing]
+                    )
+                    rerank_scores[missing] = fresh_scores
+                    for j, score in zip(missing, fresh_scores):
+                        if score_keys[j][2] is not None:
+                            self.score_cache.set(score_keys[j], float(score))
+                stats["cached_pairs"] = len(sentence_pairs) - len(missing)
             except Exception as e:
                 logger.warning(f"Reranking failed: {e}")
+                rerank_scores = None
 
-        scored_hits = []
-        for i, hit in enumerate(hits):
-            semantic_score = 1 - hit.distance
-            
-            if rerank_scores is not None:
-                score = rerank_scores[i]
-            else:
-                score = semantic_score
+        reranked = []
+        offset = 0
+        for hits in hits_lists:
+            scored_hits = []
+            for i, hit in enumerate(hits):
+                semantic_score = 1 - hit.distance
+                
+                if rerank_scores is not None:
+                    score = rerank_scores[offset + i]
+                else:
+                    score = semantic_score
+                
+                scored_hits.append((score, hit))
+            offset += len(hits)
             
-            scored_hits.append((score, hit))
-        
-        scored_hits.sort(key=lambda x: x[0], reverse=True)
-        return [hit for _, hit in scored_hits[:n_results]]
+            scored_hits.sort(key=lambda x: x[0], reverse=True)
+            reranked.append([hit for _, hit in scored_hits[:n_results]])
+
+        stats["total_ms"] = (time.perf_counter() - start) * 1000
+        return reranked, stats
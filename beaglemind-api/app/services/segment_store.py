@@ -0,0 +1,169 @@
+"""
+Segmented On-Disk Indexes
+
+Shared storage for the per-collection side indexes (BM25, symbols). Writers
+(the ingestors, possibly several processes at once) only ever add immutable
+segment files under ``<index_dir>/<collection>/``; readers merge all segments
+into one in-memory index and reload it when the set of segment files (names
+and mtimes) changes. Once a collection has more than ``max_segments`` segments the writer
+merges them into one. Writers hold an exclusive lock on ``<collection>/.lock``
+while appending and compacting, so two processes never merge (and then both
+keep) the same segments.
+"""
+
+import fcntl
+import logging
+from abc import ABC, abstractmethod
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentStore(ABC):
+    """Base class: subclasses define the segment format and the merged index."""
+
+    suffix = ".seg"
+    label = "INDEX"
+
+    def __init__(self, index_dir: str, max_segments: int = 8):
+        self.index_dir = Path(index_dir)
+        self.max_segments = max(1, int(max_segments))
+        self._loaded: Dict[str, Tuple[Hashable, Any]] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    # Segment format -------------------------------------------------------
+
+    @abstractmethod
+    def read_segment(self, path: Path) -> Any:
+        ...
+
+    @abstractmethod
+    def write_segment(self, f, segment: Any):
+        ...
+
+    @abstractmethod
+    def merge_segments(self, segments: List[Any]) -> Any:
+        """One segment equivalent to ``segments`` (used by compaction)."""
+
+    @abstractmethod
+    def build_index(self, segments: List[Any]) -> Any:
+        """In-memory index over ``segments`` (in write order)."""
+
+    # Storage ----------------------------------------------------------------
+
+    def _collection_dir(self, collection_name: str) -> Path:
+        return self.index_dir / re.sub(r'[^A-Za-z0-9_.-]', '_', collection_name)
+
+    def _segments(self, collection_name: str) -> List[Path]:
+        directory = self._collection_dir(collection_name)
+        if not directory.is_dir():
+            return []
+        return sorted(directory.glob(f"*{self.suffix}"))
+
+    def _write(self, collection_name: str, segment: Any) -> Path:
+        directory = self._collection_dir(collection_name)
+        directory.mkdir(parents=True, exist_ok=True)
+        # Time-ordered names keep merge order stable; the write is atomic
+        name = f"{time.time_ns():016x}-{uuid.uuid4().hex[:8]}"
+        tmp_path = directory / f"{name}.tmp"
+        with open(tmp_path, "wb") as f:
+            self.write_segment(f, segment)
+        path = directory / f"{name}{self.suffix}"
+        os.replace(tmp_path, path)
+        return path
+
+    @contextmanager
+    def _writer_lock(self, collection_name: str):
+        """Exclusive across processes; readers never take it."""
+        directory = self._collection_dir(collection_name)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, collection_name: str, segment: Any):
+        """Persist a new segment, compacting if the collection has too many."""
+        with self._writer_lock(collection_name):
+            self._write(collection_name, segment)
+            if len(self._segments(collection_name)) > self.max_segments:
+                self._compact(collection_name)
+
+    def compact(self, collection_name: str):
+        """Merge every current segment into one."""
+        with self._writer_lock(collection_name):
+            self._compact(collection_name)
+
+    def _compact(self, collection_name: str):
+        # Caller holds the writer lock; only the segments read here are deleted
+        paths = self._segments(collection_name)
+        if len(paths) <= 1:
+            return
+        self._write(collection_name, self.merge_segments([self.read_segment(path) for path in paths]))
+        for path in paths:
+            path.unlink(missing_ok=True)
+        logger.info(f"[{self.label}] Compacted {len(paths)} segments for '{collection_name}'")
+
+    def drop(self, collection_name: str):
+        """Delete the index of a dropped or recreated collection."""
+        shutil.rmtree(self._collection_dir(collection_name), ignore_errors=True)
+        with self._lock:
+            self._loaded.pop(collection_name, None)
+
+    def _signature(self, collection_name: str) -> Tuple:
+        """(name, mtime) of every segment; changes when one is added or compacted away"""
+        signature = []
+        for path in self._segments(collection_name):
+            try:
+                signature.append((path.name, path.stat().st_mtime_ns))
+            except FileNotFoundError:
+                continue
+        return tuple(signature)
+
+    def get(self, collection_name: str) -> Optional[Any]:
+        """Merged index for ``collection_name`` (None if it has no segments),
+        reloaded when its segment files change.
+
+        Only requests for a collection being reloaded wait for the reload;
+        the others return the index they already have.
+        """
+        signature = self._signature(collection_name)
+        with self._lock:
+            loaded = self._loaded.get(collection_name)
+            if loaded is not None and loaded[0] == signature:
+                return loaded[1]
+            load_lock = self._load_locks.setdefault(collection_name, threading.Lock())
+        with load_lock:
+            with self._lock:
+                loaded = self._loaded.get(collection_name)
+                if loaded is not None and loaded[0] == signature:
+                    return loaded[1]
+            index = self._load(collection_name)
+            with self._lock:
+                self._loaded[collection_name] = (signature, index)
+            return index
+
+    def _load(self, collection_name: str) -> Optional[Any]:
+        for _ in range(3):
+            try:
+                segments = [self.read_segment(path) for path in self._segments(collection_name)]
+            except FileNotFoundError:
+                # A compaction replaced the segments while we were reading them
+                continue
+            if not segments:
+                return None
+            logger.info(f"[{self.label}] Loaded {len(segments)} segments for '{collection_name}'")
+            return self.build_index(segments)
+        logger.warning(f"[{self.label}] Could not load a consistent index for '{collection_name}'")
+        return None
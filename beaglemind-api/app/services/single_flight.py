@@ -0,0 +1,38 @@
+"""
+Single-Flight Request Coalescing
+
+Concurrent calls with the same key share one in-flight computation instead of
+each running the full retrieval pipeline.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Deduplicates identical in-flight async calls on the running event loop."""
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.deduplicated = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``fn()``, or the already running call for ``key`` if there is one."""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.deduplicated += 1
+            logger.info(f"[SINGLE-FLIGHT] Joining in-flight request ({self.deduplicated} deduplicated so far)")
+        else:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # Shield so one caller disconnecting does not cancel the shared work
+        return await asyncio.shield(task)
@@ -0,0 +1,180 @@
+"""
+Symbol Index
+
+Maps code symbols and file keywords, as extracted by
+``GitHubDirectIngester.analyze_content`` (function and class names, imported
+modules, top keywords), to the chunks that contain them. Each entry records
+how the chunk relates to the symbol, best first:
+
+- ``definition``: the chunk defines the function or class
+- ``import``: the chunk imports the module
+- ``reference``: the chunk mentions the function or class
+- ``keyword``: the chunk contains one of its file's top keywords
+
+Segments are JSON files under SYMBOL_INDEX_DIR (see ``segment_store``). A
+lookup is a dict access, so retrieval can answer identifier queries
+(``gpio_export``, ``PRUDevice``, ``def setup_pwm``) before embedding them, and
+seed the candidate pool of other queries with the chunks defining or importing
+the identifiers they name.
+"""
+
+import json
+import logging
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.config import SYMBOL_INDEX_DIR, LEXICAL_MAX_SEGMENTS
+from app.services.segment_store import SegmentStore
+
+logger = logging.getLogger(__name__)
+
+SYMBOL_KINDS = ("definition", "import", "reference", "keyword")
+DEFINITION, IMPORT, REFERENCE, KEYWORD = range(len(SYMBOL_KINDS))
+# Contribution of one matched symbol to a chunk's seed score, per kind
+_KIND_WEIGHTS = (3.0, 2.0, 1.5, 1.0)
+# Kinds that seed the candidate pool of semantic queries
+_SEED_KINDS = (DEFINITION, IMPORT)
+
+_IMPORT_WORDS = {"import", "from", "as", "require"}
+_IDENTIFIER = re.compile(r"[A-Za-z_][\w.]*")
+# Query shapes treated as an exact symbol lookup
+_SYMBOL_QUERY = re.compile(r"^(?:(?:def|class|function)\s+)?`?([A-Za-z_][\w.:]*)`?(?:\(\))?$")
+
+
+def import_names(statements: Sequence[str]) -> List[str]:
+    """Module and name identifiers from import statements."""
+    names = []
+    for statement in statements:
+        # The extraction regexes can run past the end of the line
+        for line in statement.splitlines():
+            line = line.strip()
+            if not line.startswith(("import", "from")):
+                continue
+            names.extend(name for name in _IDENTIFIER.findall(line) if name not in _IMPORT_WORDS)
+    return names
+
+
+def chunk_symbols(chunk: str, analysis: Dict[str, Any]) -> Dict[str, int]:
+    """Symbols of ``analysis`` (an analyze_content result) that occur in ``chunk``,
+    lowercased, with the most specific kind for each."""
+    symbols: Dict[str, int] = {}
+
+    def note(symbol: str, kind: int):
+        key = symbol.lower()
+        symbols[key] = min(kind, symbols.get(key, kind))
+
+    for name in analysis.get('function_names', []) + analysis.get('class_names', []):
+        escaped = re.escape(name)
+        if re.search(rf"\b(?:def|class|function)\s+{escaped}\b|\b{escaped}\s*=\s*function"
+                     rf"|\b\w+\s+{escaped}\s*\([^)]*\)\s*\{{", chunk):
+            note(name, DEFINITION)
+        elif re.search(rf"\b{escaped}\b", chunk):
+            note(name, REFERENCE)
+    for name in import_names(analysis.get('import_statements', [])):
+        if re.search(rf"\b{re.escape(name)}\b", chunk):
+            note(name, IMPORT)
+    lowered = chunk.lower()
+    for keyword in analysis.get('keywords', []):
+        if re.search(rf"\b{re.escape(keyword)}\b", lowered):
+            note(keyword, KEYWORD)
+    return symbols
+
+
+def exact_symbol(query: str) -> Optional[str]:
+    """The identifier an exact-symbol query asks for, or None.
+
+    Only identifier-shaped queries qualify (snake_case, camelCase, dotted,
+    ``name()``, backticked or prefixed with def/class/function), so a plain
+    word is still answered by semantic search.
+    """
+    query = query.strip()
+    match = _SYMBOL_QUERY.match(query)
+    if not match:
+        return None
+    symbol = match.group(1)
+    if symbol != query or _identifier_shaped(symbol):
+        return symbol.lower()
+    return None
+
+
+def _identifier_shaped(token: str) -> bool:
+    """snake_case, camelCase or dotted, i.e. not a plain word"""
+    mixed_case = token not in (token.lower(), token.upper(), token.capitalize())
+    return mixed_case or bool(re.search(r"[_.:]", token))
+
+
+class SymbolIndex:
+    """Merged symbol -> [(chunk id, kind)] map for one collection."""
+
+    def __init__(self, entries: Dict[str, List[Tuple[str, int]]]):
+        self.entries = entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, symbol: str) -> List[Tuple[str, str]]:
+        """(chunk id, kind) pairs for ``symbol``, most specific kind first."""
+        matches = sorted(self.entries.get(symbol.lower(), []), key=lambda entry: entry[1])
+        return [(chunk_id, SYMBOL_KINDS[kind]) for chunk_id, kind in matches]
+
+    def seed(self, query: str, limit: int) -> List[str]:
+        """Up to ``limit`` chunk ids defining or importing identifiers named in
+        ``query``, best first. Plain words, references and keywords never seed."""
+        scores: Dict[str, float] = defaultdict(float)
+        # A sentence-final period is not part of the identifier
+        tokens = (token.rstrip(".") for token in _IDENTIFIER.findall(query))
+        terms = (token.lower() for token in tokens if _identifier_shaped(token))
+        for term in dict.fromkeys(terms):
+            for chunk_id, kind in self.entries.get(term, []):
+                if kind in _SEED_KINDS:
+                    scores[chunk_id] += _KIND_WEIGHTS[kind]
+        return sorted(scores, key=scores.get, reverse=True)[:limit]
+
+
+class SymbolIndexStore(SegmentStore):
+    """Symbol segments ({"ids": [...], "symbols": {symbol: [[doc, kind], ...]}}) per collection."""
+
+    suffix = ".json"
+    label = "SYMBOLS"
+
+    def read_segment(self, path: Path) -> Dict[str, Any]:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def write_segment(self, f, segment: Dict[str, Any]):
+        f.write(json.dumps(segment, separators=(",", ":")).encode("utf-8"))
+
+    def merge_segments(self, segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+        ids: List[str] = []
+        symbols: Dict[str, List[List[int]]] = defaultdict(list)
+        for segment in segments:
+            base = len(ids)
+            ids.extend(segment["ids"])
+            for symbol, postings in segment["symbols"].items():
+                symbols[symbol].extend([doc + base, kind] for doc, kind in postings)
+        return {"ids": ids, "symbols": dict(symbols)}
+
+    def build_index(self, segments: List[Dict[str, Any]]) -> SymbolIndex:
+        entries: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+        for segment in segments:
+            ids = segment["ids"]
+            for symbol, postings in segment["symbols"].items():
+                entries[symbol].extend((ids[doc], kind) for doc, kind in postings)
+        return SymbolIndex(dict(entries))
+
+    def add(self, collection_name: str, ids: Sequence[str], chunk_symbols: Sequence[Dict[str, int]]):
+        """Index the symbols of newly stored chunks as a new segment."""
+        symbols: Dict[str, List[List[int]]] = defaultdict(list)
+        for doc, found in enumerate(chunk_symbols):
+            for symbol, kind in found.items():
+                symbols[symbol].append([doc, kind])
+        if not symbols:
+            return
+        self.append(collection_name, {"ids": list(ids), "symbols": dict(symbols)})
+        logger.info(f"[SYMBOLS] Indexed {len(symbols)} symbols over {len(ids)} chunks for '{collection_name}'")
+
+
+# Global store instance
+symbol_indexes = SymbolIndexStore(SYMBOL_INDEX_DIR, LEXICAL_MAX_SEGMENTS)
@@ -0,0 +1,170 @@
+"""
+Vector Index Policy
+
+Chooses the index on a collection's embedding field from its row count
+(VECTOR_INDEX_TYPE, VECTOR_METRIC) and derives the build and search
+parameters, so every collection creator (RetrievalService and both ingestors)
+builds the same index and the retrieval service searches whatever index a
+collection actually has.
+
+Embeddings are L2-normalized, so on IP/COSINE indexes the similarity maps to
+the squared L2 distance as ``2 - 2 * similarity``; ``as_l2_distance`` lets the
+rest of the pipeline (priors, rerank margins, fusion, ``1 - distance`` scores)
+behave the same before and after a metric migration.
+"""
+
+import json
+import logging
+import math
+from typing import Any, Dict, Optional
+
+from app.config import (
+    VECTOR_INDEX_TYPE, VECTOR_METRIC, VECTOR_INDEX_FLAT_MAX_ROWS, VECTOR_INDEX_SQ8_MIN_ROWS,
+    VECTOR_SEARCH_NPROBE, VECTOR_SEARCH_EF
+)
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("FLAT", "IVF_FLAT", "IVF_SQ8", "HNSW")
+METRICS = ("L2", "IP", "COSINE")
+
+# What collections created before index policies had, assumed when an index cannot be described
+LEGACY_INDEX = {"index_type": "IVF_FLAT", "metric_type": "L2", "params": {"nlist": 1024}}
+
+# An IVF index is rebuilt once its nlist is this far off the derived value
+_NLIST_DRIFT = 4
+
+
+def ivf_nlist(rows: int) -> int:
+    """About 4 * sqrt(rows) lists, rounded to a power of two (16..65536)"""
+    target = 4 * math.sqrt(max(rows, 1))
+    return int(min(65536, max(16, 2 ** round(math.log2(target)))))
+
+
+def hnsw_params(rows: int) -> Dict[str, int]:
+    m = 16 if rows < 1_000_000 else 32
+    return {"M": m, "efConstruction": 8 * m}
+
+
+def choose_index_type(rows: int, index_type: Optional[str] = None) -> str:
+    index_type = (index_type or VECTOR_INDEX_TYPE).upper()
+    if index_type != "AUTO":
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown vector index type: {index_type}")
+        return index_type
+    if rows < VECTOR_INDEX_FLAT_MAX_ROWS:
+        return "FLAT"
+    if rows >= VECTOR_INDEX_SQ8_MIN_ROWS:
+        return "IVF_SQ8"
+    return "HNSW"
+
+
+def index_params(rows: int, index_type: Optional[str] = None, metric: Optional[str] = None) -> Dict[str, Any]:
+    """create_index parameters for a collection of ``rows`` vectors"""
+    index_type = choose_index_type(rows, index_type)
+    metric = (metric or VECTOR_METRIC).upper()
+    if metric not in METRICS:
+        raise ValueError(f"Unknown vector metric: {metric}")
+    if index_type == "HNSW":
+        params = hnsw_params(rows)
+    elif index_type.startswith("IVF"):
+        params = {"nlist": ivf_nlist(rows)}
+    else:
+        params = {}
+    return {"index_type": index_type, "metric_type": metric, "params": params}
+
+
+def describe_index(collection, field_name: str = "embedding") -> Optional[Dict[str, Any]]:
+    """{"index_type", "metric_type", "params"} of the index on ``field_name``, or None"""
+    for index in collection.indexes:
+        if index.field_name != field_name:
+            continue
+        info = dict(index.params)
+        params = info.get("params")
+        if isinstance(params, str):
+            params = json.loads(params)
+        if not params:
+            params = {key: value for key, value in info.items() if key not in ("index_type", "metric_type", "params")}
+        return {
+            "index_type": str(info.get("index_type", "FLAT")).upper(),
+            "metric_type": str(info.get("metric_type", "L2")).upper(),
+            "params": {key: int(value) for key, value in params.items() if str(value).isdigit()},
+        }
+    return None
+
+
+def search_params(index: Dict[str, Any], limit: int, nprobe: Optional[int] = None,
+                  ef: Optional[int] = None) -> Dict[str, Any]:
+    """Search parameters for ``index``; nprobe/ef default to VECTOR_SEARCH_* or are derived"""
+    index_type = index["index_type"]
+    params: Dict[str, int] = {}
+    if index_type.startswith("IVF"):
+        nlist = index["params"].get("nlist", LEGACY_INDEX["params"]["nlist"])
+        nprobe = nprobe or VECTOR_SEARCH_NPROBE or max(8, nlist // 64)
+        params["nprobe"] = min(nprobe, nlist)
+    elif index_type == "HNSW":
+        # Milvus requires ef >= limit
+        params["ef"] = max(ef or VECTOR_SEARCH_EF or max(64, 2 * limit), limit)
+    return {"metric_type": index["metric_type"], "params": params}
+
+
+def as_l2_distance(metric: str, distance: float) -> float:
+    """Squared L2 distance between normalized vectors for a search result distance"""
+    if metric in ("IP", "COSINE"):
+        return 2.0 - 2.0 * distance
+    return distance
+
+
+def needs_rebuild(current: Optional[Dict[str, Any]], target: Dict[str, Any]) -> bool:
+    if current is None:
+        return True
+    if current["index_type"] != target["index_type"] or current["metric_type"] != target["metric_type"]:
+        return True
+    if target["index_type"].startswith("IVF"):
+        nlist = current["params"].get("nlist", 0)
+        wanted = target["params"]["nlist"]
+        return not wanted / _NLIST_DRIFT <= nlist <= wanted * _NLIST_DRIFT
+    if target["index_type"] == "HNSW":
+        return current["params"].get("M") != target["params"]["M"]
+    return False
+
+
+def report_index_drift(collection, field_name: str = "embedding") -> bool:
+    """Log (and return) whether the index no longer matches the policy, without rebuilding it"""
+    target = index_params(collection.num_entities)
+    current = describe_index(collection, field_name)
+    if not needs_rebuild(current, target):
+        return False
+    logger.warning(f"[INDEX] '{collection.name}' vector index "
+                   f"{current['index_type'] + '/' + current['metric_type'] if current else 'none'} no longer matches "
+                   f"the policy ({target['index_type']}/{target['metric_type']} {target['params']}); run "
+                   f"app.scripts.reindex_collection during a maintenance window")
+    return True
+
+
+def ensure_vector_index(collection, field_name: str = "embedding", index_type: Optional[str] = None,
+                        metric: Optional[str] = None, force: bool = False) -> Optional[Dict[str, Any]]:
+    """Rebuild the vector index if it no longer matches the policy for the
+    collection's current size and metric. Returns the new index parameters,
+    or None if the index was kept.
+
+    Milvus only drops indexes of released collections, so searches fail until
+    the collection is loaded again; only use it where that outage is accepted
+    (reindex_collection, or ingestors with VECTOR_INDEX_AUTO_REBUILD).
+    """
+    rows = collection.num_entities
+    target = index_params(rows, index_type, metric)
+    current = describe_index(collection, field_name)
+    if not force and not needs_rebuild(current, target):
+        return None
+    logger.info(f"[INDEX] Rebuilding '{collection.name}' vector index for {rows} rows: "
+                f"{current['index_type'] + '/' + current['metric_type'] if current else 'none'} -> "
+                f"{target['index_type']}/{target['metric_type']} {target['params']}")
+    if current is not None:
+        collection.release()
+        for index in collection.indexes:
+            if index.field_name == field_name:
+                index.drop()
+    collection.create_index(field_name, target)
+    collection.load()
+    return target
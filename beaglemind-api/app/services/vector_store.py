@@ -0,0 +1,497 @@
+"""
+Vector Store Backends
+
+``Collection`` and ``utility`` resolve to pymilvus (VECTOR_STORE=milvus) or to
+the embedded store below (VECTOR_STORE=local), so the retrieval service and
+the ingestors run unchanged against either; with the local store the API needs
+no network services at all.
+
+A local collection is a directory under VECTOR_STORE_DIR:
+
+- ``schema.json``: the pymilvus schema (field names, types and params)
+- ``vectors.f32``: the embeddings, one float32 row per entity, appended on
+  insert and memory-mapped for search
+- ``columns.jsonl``: the other fields, one line per insert batch holding a
+  list of values per field
+- ``index.json``: the last create_index parameters (only the metric is used)
+
+Writers (several ingestor processes at once) append under an exclusive file
+lock; readers pick up complete batches on the next call. Search is an exact,
+vectorized top-k scan, or scans the nearest LOCAL_IVF_NPROBE of
+LOCAL_IVF_NLIST k-means lists once a collection reaches LOCAL_IVF_MIN_ROWS.
+Only the subset of the pymilvus API used in this repo is implemented.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from pymilvus import CollectionSchema, DataType, FieldSchema
+
+from app.config import (
+    VECTOR_STORE, VECTOR_STORE_DIR, LOCAL_IVF_NLIST, LOCAL_IVF_NPROBE, LOCAL_IVF_MIN_ROWS
+)
+
+logger = logging.getLogger(__name__)
+
+USE_LOCAL_STORE = VECTOR_STORE == "local"
+
+_SCHEMA_FILE = "schema.json"
+_VECTORS_FILE = "vectors.f32"
+_COLUMNS_FILE = "columns.jsonl"
+_LOCK_FILE = ".lock"
+_INDEX_FILE = "index.json"
+
+# Filter expressions supported by query/search: `field in [...]` and `field == value`
+_IN_EXPR = re.compile(r"^\s*(\w+)\s+in\s+(\[.*\])\s*$", re.S)
+_EQ_EXPR = re.compile(r"^\s*(\w+)\s*==\s*(.+?)\s*$", re.S)
+
+# Rows scored per block when assigning vectors to IVF lists
+_ASSIGN_BLOCK = 65536
+
+
+class LocalIndex:
+    """Index description shaped like a pymilvus ``Index``"""
+
+    def __init__(self, collection_name: str, field_name: str, params: Dict[str, Any]):
+        self.collection_name = collection_name
+        self.field_name = field_name
+        self.params = params
+
+    def drop(self, **kwargs):
+        (_collection_dir(self.collection_name) / _INDEX_FILE).unlink(missing_ok=True)
+
+
+class LocalHit:
+    """Search result shaped like a pymilvus hit"""
+
+    def __init__(self, id: Any, distance: float, entity: Dict[str, Any]):
+        self.id = id
+        self.distance = distance
+        self.score = distance
+        self.entity = entity
+
+
+def _collection_dir(collection_name: str) -> Path:
+    return Path(VECTOR_STORE_DIR) / re.sub(r'[^A-Za-z0-9_.-]', '_', collection_name)
+
+
+def _schema_to_json(schema: CollectionSchema) -> Dict[str, Any]:
+    return {
+        "description": schema.description,
+        "fields": [
+            {"name": field.name, "dtype": field.dtype.name, "is_primary": bool(field.is_primary),
+             "params": dict(field.params)}
+            for field in schema.fields
+        ],
+    }
+
+
+def _schema_from_json(data: Dict[str, Any]) -> CollectionSchema:
+    fields = [
+        FieldSchema(name=field["name"], dtype=DataType[field["dtype"]],
+                    is_primary=field["is_primary"], **field["params"])
+        for field in data["fields"]
+    ]
+    return CollectionSchema(fields, data.get("description", ""))
+
+
+def _parse_expr(expr: Optional[str]):
+    """(field, allowed values) for a filter expression, or None for no filter"""
+    if not expr or not expr.strip():
+        return None
+    match = _IN_EXPR.match(expr)
+    if match:
+        return match.group(1), set(json.loads(match.group(2)))
+    match = _EQ_EXPR.match(expr)
+    if match:
+        value = match.group(2)
+        if value.startswith("'") and value.endswith("'"):
+            value = json.dumps(value[1:-1])
+        return match.group(1), {json.loads(value)}
+    raise ValueError(f"Unsupported filter expression for the local vector store: {expr}")
+
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (L2) for each row, in blocks"""
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_BLOCK):
+        block = np.asarray(vectors[start:start + _ASSIGN_BLOCK], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmin(centroid_norms - 2.0 * block @ centroids.T, axis=1)
+    return assignments
+
+
+class _IVFLists:
+    """Coarse k-means partition of a collection's vectors"""
+
+    def __init__(self, vectors: np.ndarray, nlist: int, iterations: int = 10):
+        rng = np.random.default_rng(0)
+        sample_size = min(len(vectors), nlist * 64)
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = _nearest_centroids(sample, centroids)
+            counts = np.bincount(assignments, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        self.centroids = centroids
+        self.trained_rows = len(vectors)
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.extend(vectors)
+
+    def extend(self, vectors: np.ndarray):
+        """Assign rows added since the last call to their lists"""
+        if len(vectors) > len(self.assignments):
+            new = _nearest_centroids(vectors[len(self.assignments):], self.centroids)
+            self.assignments = np.concatenate([self.assignments, new])
+        self.order = np.argsort(self.assignments, kind="stable")
+        self.bounds = np.searchsorted(self.assignments[self.order], np.arange(len(self.centroids) + 1))
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Row numbers in the ``nprobe`` lists closest to ``query``"""
+        distances = np.einsum("ij,ij->i", self.centroids, self.centroids) - 2.0 * self.centroids @ query
+        nprobe = min(max(1, nprobe), len(self.centroids))
+        probes = np.argpartition(distances, nprobe - 1)[:nprobe]
+        return np.sort(np.concatenate([self.order[self.bounds[c]:self.bounds[c + 1]] for c in probes]))
+
+
+class _LocalStore:
+    """In-memory view of one collection directory, shared by its handles"""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.schema_mtime_ns = (directory / _SCHEMA_FILE).stat().st_mtime_ns
+        schema_data = json.loads((directory / _SCHEMA_FILE).read_text(encoding="utf-8"))
+        self.schema = _schema_from_json(schema_data)
+        self.primary_field = next(f.name for f in self.schema.fields if f.is_primary)
+        vector_fields = [f for f in self.schema.fields if f.dtype == DataType.FLOAT_VECTOR]
+        if len(vector_fields) != 1:
+            raise ValueError("The local vector store needs exactly one FLOAT_VECTOR field")
+        self.vector_field = vector_fields[0].name
+        self.dim = int(vector_fields[0].params["dim"])
+        self.scalar_fields = [f.name for f in self.schema.fields if f.name != self.vector_field]
+        self._reset()
+
+    def _reset(self):
+        self.rows = 0
+        self.columns: Dict[str, List[Any]] = {name: [] for name in self.scalar_fields}
+        self.row_of: Dict[Any, int] = {}
+        self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self.sq_norms = np.zeros(0, dtype=np.float32)
+        self.ivf: Optional[_IVFLists] = None
+        self._columns_offset = 0
+
+    def refresh(self):
+        """Pick up batches appended since the last refresh (by any process)"""
+        with self.lock:
+            columns_path = self.directory / _COLUMNS_FILE
+            try:
+                size = columns_path.stat().st_size
+            except FileNotFoundError:
+                size = 0
+            if size < self._columns_offset:
+                # The collection was dropped and recreated
+                self._reset()
+            if size > self._columns_offset:
+                with open(columns_path, "rb") as f:
+                    f.seek(self._columns_offset)
+                    data = f.read(size - self._columns_offset)
+                # A batch still being written has no trailing newline yet
+                complete = data[:data.rfind(b"\n") + 1]
+                for line in complete.splitlines():
+                    batch = json.loads(line)
+                    for name in self.scalar_fields:
+                        self.columns[name].extend(batch.get(name, [None] * batch["rows"]))
+                    self.rows += batch["rows"]
+                self._columns_offset += len(complete)
+                for row in range(len(self.row_of), self.rows):
+                    self.row_of[self.columns[self.primary_field][row]] = row
+            if self.rows != len(self.vectors):
+                self._map_vectors()
+            return self.rows, self.vectors, self.sq_norms
+
+    def _map_vectors(self):
+        old_rows = len(self.vectors)
+        self.vectors = np.memmap(self.directory / _VECTORS_FILE, dtype=np.float32, mode="r",
+                                 shape=(self.rows, self.dim)) if self.rows else self.vectors[:0]
+        added = np.asarray(self.vectors[old_rows:])
+        self.sq_norms = np.concatenate([self.sq_norms[:old_rows], np.einsum("ij,ij->i", added, added)])
+        if self.ivf is not None:
+            if self.rows > 2 * self.ivf.trained_rows:
+                self.ivf = None
+            else:
+                self.ivf.extend(self.vectors)
+
+    def ivf_lists(self) -> Optional[_IVFLists]:
+        """IVF partition once the collection is large enough (trained lazily)"""
+        if LOCAL_IVF_NLIST <= 0 or self.rows < max(LOCAL_IVF_MIN_ROWS, LOCAL_IVF_NLIST):
+            return None
+        with self.lock:
+            if self.ivf is None:
+                self.ivf = _IVFLists(self.vectors, LOCAL_IVF_NLIST)
+                logger.info(f"[VECTORS] Trained {LOCAL_IVF_NLIST} IVF lists over {self.rows} vectors "
+                            f"in '{self.directory.name}'")
+            return self.ivf
+
+    def insert(self, values: Dict[str, Sequence[Any]]):
+        vectors = np.asarray(values[self.vector_field], dtype=np.float32).reshape(-1, self.dim)
+        batch = {"rows": len(vectors)}
+        for name in self.scalar_fields:
+            column = values.get(name)
+            if column is None or len(column) != len(vectors):
+                raise ValueError(f"Field '{name}' needs {len(vectors)} values")
+            batch[name] = np.asarray(column).tolist() if isinstance(column, np.ndarray) else list(column)
+        with open(self.directory / _LOCK_FILE, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            rows = self.refresh()[0]
+            with open(self.directory / _VECTORS_FILE, "ab") as f:
+                # Drop vectors of a batch whose columns were never written (interrupted insert)
+                f.truncate(rows * self.dim * 4)
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.directory / _COLUMNS_FILE, "ab") as f:
+                f.write(json.dumps(batch, separators=(",", ":")).encode("utf-8") + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+        return len(vectors)
+
+    def matching_rows(self, expr: Optional[str], rows: int) -> Optional[np.ndarray]:
+        """Boolean mask over the first ``rows`` rows for ``expr`` (None = all rows)"""
+        parsed = _parse_expr(expr)
+        if parsed is None:
+            return None
+        field, allowed = parsed
+        if field not in self.columns:
+            raise ValueError(f"Unknown field in filter expression: {field}")
+        mask = np.zeros(rows, dtype=bool)
+        if field == self.primary_field:
+            for value in allowed:
+                row = self.row_of.get(value)
+                if row is not None and row < rows:
+                    mask[row] = True
+        else:
+            column = self.columns[field]
+            for row in range(rows):
+                mask[row] = column[row] in allowed
+        return mask
+
+    def entity(self, row: int, output_fields: Sequence[str]) -> Dict[str, Any]:
+        entity = {}
+        for name in output_fields:
+            if name == self.vector_field:
+                entity[name] = np.asarray(self.vectors[row]).tolist()
+            elif name in self.columns:
+                entity[name] = self.columns[name][row]
+        return entity
+
+
+_stores: Dict[str, _LocalStore] = {}
+_stores_lock = threading.Lock()
+
+
+def _open_store(collection_name: str) -> _LocalStore:
+    schema_path = _collection_dir(collection_name) / _SCHEMA_FILE
+    with _stores_lock:
+        store = _stores.get(collection_name)
+        # Reopen collections another process dropped and recreated
+        if store is None or store.schema_mtime_ns != schema_path.stat().st_mtime_ns:
+            store = _LocalStore(schema_path.parent)
+            _stores[collection_name] = store
+        return store
+
+
+class LocalCollection:
+    """Embedded collection with the pymilvus ``Collection`` methods this repo uses"""
+
+    def __init__(self, name: str, schema: Optional[CollectionSchema] = None, **kwargs):
+        self.name = name
+        directory = _collection_dir(name)
+        if not (directory / _SCHEMA_FILE).exists():
+            if schema is None:
+                raise ValueError(f"Collection '{name}' does not exist in the local vector store")
+            directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = directory / f"{_SCHEMA_FILE}.tmp"
+            tmp_path.write_text(json.dumps(_schema_to_json(schema)), encoding="utf-8")
+            os.replace(tmp_path, directory / _SCHEMA_FILE)
+            logger.info(f"[VECTORS] Created local collection '{name}' in {directory}")
+        self._store = _open_store(name)
+
+    @property
+    def schema(self) -> CollectionSchema:
+        return self._store.schema
+
+    @property
+    def num_entities(self) -> int:
+        return self._store.refresh()[0]
+
+    def load(self, *args, **kwargs):
+        self._store.refresh()
+
+    def release(self, *args, **kwargs):
+        pass
+
+    def flush(self, *args, **kwargs):
+        pass
+
+    def create_index(self, field_name: str, index_params: Optional[Dict[str, Any]] = None, **kwargs):
+        """Record the index parameters; vectors are scanned exactly or through
+        the IVF lists (see LOCAL_IVF_*) whatever the index type"""
+        if field_name != self._store.vector_field:
+            return
+        path = _collection_dir(self.name) / _INDEX_FILE
+        path.write_text(json.dumps({"field_name": field_name, "params": index_params or {}}), encoding="utf-8")
+
+    @property
+    def indexes(self) -> List[LocalIndex]:
+        try:
+            data = json.loads((_collection_dir(self.name) / _INDEX_FILE).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return []
+        return [LocalIndex(self.name, data["field_name"], data["params"])]
+
+    def insert(self, data, **kwargs) -> int:
+        """Insert a list of columns in schema order (or a dict of columns)"""
+        if isinstance(data, dict):
+            values = data
+        else:
+            names = [field.name for field in self.schema.fields]
+            if len(data) != len(names):
+                raise ValueError(f"Expected {len(names)} columns, got {len(data)}")
+            values = dict(zip(names, data))
+        return self._store.insert(values)
+
+    def query(self, expr: str = "", output_fields: Optional[List[str]] = None,
+              limit: Optional[int] = None, **kwargs) -> List[Dict[str, Any]]:
+        store = self._store
+        rows = store.refresh()[0]
+        mask = store.matching_rows(expr, rows)
+        matched = np.flatnonzero(mask) if mask is not None else np.arange(rows)
+        if limit is not None:
+            matched = matched[:limit]
+        fields = list(dict.fromkeys([store.primary_field] + list(output_fields or [])))
+        return [store.entity(int(row), fields) for row in matched]
+
+    def search(self, data, anns_field: str, param: Optional[Dict[str, Any]], limit: int,
+               expr: Optional[str] = None, output_fields: Optional[List[str]] = None,
+               group_by_field: Optional[str] = None, group_size: int = 1,
+               strict_group_size: bool = False, **kwargs) -> List[List[LocalHit]]:
+        """Top ``limit`` hits per query vector, closest first.
+
+        L2 distances are squared, as in Milvus; IP and COSINE report the
+        similarity (higher is closer). With ``group_by_field`` at most
+        ``group_size`` hits are kept per value, for up to ``limit`` values.
+        """
+        store = self._store
+        if anns_field != store.vector_field:
+            raise ValueError(f"Unknown vector field: {anns_field}")
+        rows, vectors, sq_norms = store.refresh()
+        queries = np.asarray(data, dtype=np.float32).reshape(-1, store.dim)
+        param = param or {}
+        metric = str(param.get("metric_type", "L2")).upper()
+        nprobe = int((param.get("params") or {}).get("nprobe", LOCAL_IVF_NPROBE))
+        mask = store.matching_rows(expr, rows)
+        ivf = store.ivf_lists()
+        fields = [name for name in (output_fields or []) if name != store.primary_field]
+
+        results = []
+        if rows == 0 or limit <= 0:
+            return [[] for _ in queries]
+        full_scan = None if ivf is not None else queries @ np.asarray(vectors).T
+        for i, query in enumerate(queries):
+            if ivf is None:
+                candidates, dots = None, full_scan[i]
+            else:
+                candidates = ivf.candidates(query, nprobe)
+                # Lists may already cover rows inserted after this snapshot
+                candidates = candidates[candidates < rows]
+                if not len(candidates):
+                    # Every probed list is empty; Milvus returns no hits either
+                    results.append([])
+                    continue
+                dots = np.asarray(vectors[candidates]) @ query
+            norms = sq_norms if candidates is None else sq_norms[candidates]
+            # Lower is closer in every metric; converted back when reported
+            if metric == "IP":
+                distances = -dots
+            elif metric == "COSINE":
+                distances = -dots / np.maximum(np.sqrt(norms) * np.linalg.norm(query), 1e-12)
+            else:
+                distances = norms - 2.0 * dots + float(query @ query)
+            if mask is not None:
+                distances = np.where(mask if candidates is None else mask[candidates], distances, np.inf)
+
+            if group_by_field:
+                order = np.argsort(distances, kind="stable")
+            else:
+                k = min(limit, len(distances))
+                order = np.argpartition(distances, k - 1)[:k]
+                order = order[np.argsort(distances[order], kind="stable")]
+            hits = []
+            groups: Dict[Any, int] = {}
+            for position in order:
+                distance = float(distances[position])
+                if distance == np.inf:
+                    break
+                row = int(position if candidates is None else candidates[position])
+                if group_by_field:
+                    group = store.columns[group_by_field][row]
+                    if group not in groups and len(groups) >= limit:
+                        continue
+                    if groups.get(group, 0) >= group_size:
+                        continue
+                    groups[group] = groups.get(group, 0) + 1
+                reported = distance if metric not in ("IP", "COSINE") else -distance
+                hits.append(LocalHit(store.columns[store.primary_field][row], reported,
+                                     store.entity(row, fields)))
+                if not group_by_field and len(hits) >= limit:
+                    break
+                if group_by_field and len(groups) >= limit and all(n >= group_size for n in groups.values()):
+                    break
+            results.append(hits)
+        return results
+
+    def drop(self, **kwargs):
+        local_utility.drop_collection(self.name)
+
+
+class LocalUtility:
+    """The pymilvus ``utility`` functions this repo uses, for local collections"""
+
+    @staticmethod
+    def has_collection(collection_name: str, **kwargs) -> bool:
+        return (_collection_dir(collection_name) / _SCHEMA_FILE).exists()
+
+    @staticmethod
+    def drop_collection(collection_name: str, **kwargs):
+        shutil.rmtree(_collection_dir(collection_name), ignore_errors=True)
+        with _stores_lock:
+            _stores.pop(collection_name, None)
+        logger.info(f"[VECTORS] Dropped local collection '{collection_name}'")
+
+    @staticmethod
+    def list_collections(**kwargs) -> List[str]:
+        root = Path(VECTOR_STORE_DIR)
+        if not root.is_dir():
+            return []
+        return sorted(path.name for path in root.iterdir() if (path / _SCHEMA_FILE).exists())
+
+
+local_utility = LocalUtility()
+
+if USE_LOCAL_STORE:
+    Collection = LocalCollection
+    utility = local_utility
+else:
+    from pymilvus import Collection, utility  # noqa: F401
@@ -92,18 +92,19 @@ async def startup_tasks():
         try:
             app_dir = Path(__file__).resolve().parent  # /app inside container
             json_path = app_dir / "data" / "scraped_threads_complete.json"
-            script_path = app_dir / "app" / "scripts" / "forum_ingestor.py"
             if json_path.exists():
+                # Run as a module so the script can import the app package
                 cmd = [
                     sys.executable,
-                    str(script_path),
+                    "-m",
+                    "app.scripts.forum_ingestor",
                     str(json_path),
                     "--collection",
                     "beagleboard",
                 ]
                 logger.info(f"[STARTUP] Running forum ingestor: {' '.join(cmd)}")
                 # Run in a separate process so it doesn't block; let it log to stdout
-                proc = await asyncio.create_subprocess_exec(*cmd)
+                proc = await asyncio.create_subprocess_exec(*cmd, cwd=str(app_dir))
                 # Don't await completion; it can run in background
             else:
                 logger.warning(f"[STARTUP] Forum JSON not found at {json_path}; skipping forum ingest")